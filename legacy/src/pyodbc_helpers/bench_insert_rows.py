@@ -0,0 +1,68 @@
+"""Measure `insert_rows` throughput and peak client memory at several chunk sizes.
+
+Rows are generated lazily and inserted into an in-memory SQLite database through a
+minimal pyodbc-like wrapper of `sqlite3`, so no ODBC driver is needed.
+
+Usage: python bench_insert_rows.py [number-of-rows]
+"""
+import sqlite3
+import sys
+import time
+import tracemalloc
+from pyodbc_helpers import insert_rows
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+CHUNK_SIZES = [100, 1_000, 10_000, 100_000, N]
+
+class SqliteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._cursor.close()
+
+    def execute(self, sql, *params):
+        self._cursor.execute(sql, params)
+
+    def executemany(self, sql, params):
+        self._cursor.executemany(sql, params)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+class SqliteConnection:
+    """The part of a pyodbc connection used by `insert_rows`, backed by sqlite3."""
+    def __init__(self):
+        self._connection = sqlite3.connect(':memory:')
+        self._connection.execute('CREATE TABLE users (id INT, name VARCHAR(128), score REAL)')
+        self.autocommit = True
+
+    def cursor(self):
+        return SqliteCursor(self._connection)
+
+    def rollback(self):
+        self._connection.rollback()
+
+def fix_rows():
+    return ({'id': i, 'name': f'user {i}', 'score': i / 7} for i in range(N))
+
+def main():
+    for chunk_size in CHUNK_SIZES:
+        dbc = SqliteConnection()
+        tracemalloc.start()
+        start = time.perf_counter()
+        insert_rows(fix_rows(), 'users', dbc, chunk_size=chunk_size)
+        seconds = time.perf_counter() - start
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'chunk {chunk_size:>9,} {seconds:8.3f}s {N / seconds:12,.0f} rows/s peak {peak / 2**20:8.1f} MiB')
+
+if __name__ == "__main__":
+    main()
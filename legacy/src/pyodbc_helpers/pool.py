@@ -0,0 +1,260 @@
+import collections
+import contextlib
+import threading
+import time
+from collections import namedtuple
+
+PoolStats = namedtuple('PoolStats', 'max_size,size,idle,in_use,borrows,waits,total_wait,max_wait,'
+                                    'created,discarded,utilization')
+
+def ping(dbc):
+    """Default connection validation, runs `SELECT 1`."""
+    cursor = dbc.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+    finally:
+        cursor.close()
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the borrow timeout."""
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections opened with `connect`.
+
+    Parameters
+    ----------
+       :connect:callable: opens a new connection, e.g. `lambda: pyodbc.connect(conn_str)`.
+       :max_size:int: the maximum number of open connections, idle or in use.
+       :idle_timeout:float: seconds after which an idle connection is closed instead of reused.
+                            None keeps idle connections open.
+       :validate:callable: called with an idle connection before it is borrowed, it returns
+                           False or raises when the connection is broken; the connection is then
+                           closed and replaced. The default `ping` runs `SELECT 1`.
+                           None disables validation.
+       :timeout:float: the default number of seconds to wait for a connection, None waits forever.
+
+    Connections are borrowed with `checkout` or `connect` and rolled back when returned, so an
+    unfinished transaction does not leak to the next borrower. A connection from `connect` used
+    in a `with` block commits when the block succeeds, like a connection does. `stats` reports
+    wait times and utilization, the average share of `max_size` connections in use since the
+    pool was created.
+    """
+    def __init__(self, connect, max_size=10, idle_timeout=300, validate=ping, timeout=None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.validate = validate
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._idle = collections.deque()
+        self._size = 0
+        self._closed = False
+        self._borrows = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._created = 0
+        self._discarded = 0
+        self._started = self._changed = time.monotonic()
+        self._busy_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextlib.contextmanager
+    def checkout(self, timeout=None):
+        """Borrow a connection for the duration of a `with` block."""
+        dbc = self.acquire(timeout)
+        try:
+            yield dbc
+        finally:
+            self.release(dbc)
+
+    def connect(self, timeout=None):
+        """Borrow a connection which is returned to the pool by its `close` method.
+
+        The pool's `connect` can be used wherever a connect callable is expected,
+        e.g. as the `connect_factory` of `parallel_insert_rows`, which then uses at most
+        `max_size` workers.
+        """
+        return PooledConnection(self, self.acquire(timeout))
+
+    def acquire(self, timeout=None):
+        """Borrow a connection, it must be given back with `release`."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        waited = False
+        expired = []
+        try:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise RuntimeError('Connection pool is closed')
+                    self._update_busy_time()
+                    dbc = self._pop_idle(expired)
+                    if dbc is not None or self._size < self.max_size:
+                        if dbc is None:
+                            self._size += 1
+                        break
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeoutError(f'No connection available within {timeout} seconds')
+                    waited = True
+                    self._condition.wait(remaining)
+                wait = time.monotonic() - start
+                self._borrows += 1
+                if waited:
+                    self._waits += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+        finally:
+            # Expired connections are closed outside of the lock, closing can take a while
+            for expired_dbc in expired:
+                _close_quietly(expired_dbc)
+        # Connections are opened and validated outside of the lock, they can take a while
+        try:
+            if dbc is not None and not self._is_valid(dbc):
+                with self._condition:
+                    self._discarded += 1
+                _close_quietly(dbc)
+                dbc = None
+            if dbc is None:
+                dbc = self._connect()
+                with self._condition:
+                    self._created += 1
+        except BaseException:
+            with self._condition:
+                self._update_busy_time()
+                self._size -= 1
+                self._condition.notify()
+            raise
+        return dbc
+
+    def release(self, dbc):
+        """Return a borrowed connection to the pool."""
+        try:
+            dbc.rollback()
+            reusable = True
+        except Exception:
+            reusable = False
+        with self._condition:
+            self._update_busy_time()
+            if reusable and not self._closed:
+                self._idle.append((dbc, time.monotonic()))
+                self._condition.notify()
+                return
+            self._size -= 1
+            if not reusable:
+                self._discarded += 1
+            self._condition.notify()
+        _close_quietly(dbc)
+
+    def close(self):
+        """Close the idle connections, borrowed connections are closed when released."""
+        with self._condition:
+            self._update_busy_time()
+            self._closed = True
+            idle = [dbc for dbc, released_at in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for dbc in idle:
+            _close_quietly(dbc)
+
+    def stats(self):
+        """Returns the PoolStats of the pool. Wait times are in seconds."""
+        with self._condition:
+            self._update_busy_time()
+            elapsed = self._changed - self._started
+            in_use = self._size - len(self._idle)
+            return PoolStats(max_size=self.max_size,
+                             size=self._size,
+                             idle=len(self._idle),
+                             in_use=in_use,
+                             borrows=self._borrows,
+                             waits=self._waits,
+                             total_wait=self._total_wait,
+                             max_wait=self._max_wait,
+                             created=self._created,
+                             discarded=self._discarded,
+                             utilization=self._busy_time / (elapsed * self.max_size) if elapsed else 0.0)
+
+    def _pop_idle(self, expired):
+        """Return the most recently released idle connection, moving expired ones to `expired`."""
+        if self.idle_timeout is not None:
+            expires = time.monotonic() - self.idle_timeout
+            while self._idle and self._idle[0][1] < expires:
+                dbc, released_at = self._idle.popleft()
+                self._size -= 1
+                self._discarded += 1
+                expired.append(dbc)
+        if not self._idle:
+            return None
+        dbc, released_at = self._idle.pop()
+        return dbc
+
+    def _update_busy_time(self):
+        # Integrates the number of connections in use over time, call it before it changes
+        now = time.monotonic()
+        self._busy_time += (self._size - len(self._idle)) * (now - self._changed)
+        self._changed = now
+
+    def _is_valid(self, dbc):
+        if self.validate is None:
+            return True
+        try:
+            return self.validate(dbc) is not False
+        except Exception:
+            return False
+
+
+class PooledConnection:
+    """Proxy of a borrowed connection, `close` returns the connection to its pool.
+
+    Used as a context manager it commits when the `with` block succeeds and rolls back when
+    it raises, like the connection itself, and then returns the connection to the pool.
+    """
+    def __init__(self, pool, dbc):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_dbc', dbc)
+
+    def __getattr__(self, name):
+        if self._dbc is None:
+            raise RuntimeError('Connection was returned to the pool')
+        return getattr(self._dbc, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._dbc, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Like a DB-API connection, commit when the block succeeds, then return to the pool
+        try:
+            if exc_type is None:
+                self._dbc.commit()
+            else:
+                self._dbc.rollback()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._dbc is not None:
+            dbc = self._dbc
+            object.__setattr__(self, '_dbc', None)
+            self._pool.release(dbc)
+
+
+def _close_quietly(dbc):
+    try:
+        dbc.close()
+    except Exception:
+        pass
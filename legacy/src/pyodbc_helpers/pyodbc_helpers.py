@@ -1,24 +1,177 @@
+import functools
+import itertools
+import queue
+import threading
 from collections import namedtuple
+from collections.abc import Mapping
 
-def insert_rows(rows, table_name, dbc):
-    field_names = rows[0].keys()
+PartitionError = namedtuple('PartitionError', 'start,num_rows,error')
+
+class ParallelInsertError(Exception):
+    """Raised by `parallel_insert_rows` when some partitions failed.
+
+    `errors` is a list of PartitionError with the input offset and size of each failed
+    partition. `num_rows` is the number of rows inserted by the partitions which succeeded.
+    """
+    def __init__(self, errors, num_rows):
+        super().__init__(f'{len(errors)} partition(s) failed, {num_rows} rows inserted, '
+                         f'first error: {errors[0].error!r}')
+        self.errors = errors
+        self.num_rows = num_rows
+
+def insert_rows(rows, table_name, dbc, chunk_size=10000, commit_each_chunk=False,
+                fast_executemany=False, input_sizes=None):
+    """Insert the dictionary-like `rows` into `table_name` and return the number of inserted rows.
+
+    `rows` can be any iterable, the field names are taken from the first row. Rows are sent
+    to `executemany` in chunks of `chunk_size`, so only one chunk of parameters is in memory.
+    The rows are committed once at the end or, with `commit_each_chunk`, after each chunk.
+    On error the current transaction is rolled back, chunks already committed are kept.
+
+    `fast_executemany` turns on pyodbc's array parameter binding, which sends a whole chunk
+    in one round trip. It is ignored by cursors without the `fast_executemany` attribute.
+    If the first chunk fails in this mode with an error which is not a DB-API IntegrityError
+    or DataError, it is rolled back and retried without it. If the retry fails as well,
+    the error of the first attempt is raised.
+    `input_sizes` are the type/size hints passed to `cursor.setinputsizes`, e.g.
+    `(pyodbc.SQL_WVARCHAR, 128, 0)`, as a list in field order or a dictionary by field name.
+    They spare the driver from rebinding parameters when the values change type or size.
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return 0
+    field_names = list(first_row.keys())
     field_names_str = ', '.join(field_names)
     placeholder_str = ','.join('?'*len(field_names))
     insert_sql = f'INSERT INTO {table_name}({field_names_str}) VALUES ({placeholder_str})'
+    if isinstance(input_sizes, dict):
+        input_sizes = [input_sizes.get(field_name) for field_name in field_names]
+    rows = itertools.chain([first_row], rows)
+    num_rows = 0
     saved_autocommit = dbc.autocommit
     with dbc.cursor() as cursor:
         try:
             dbc.autocommit = False
-            tuples = [ tuple((row[field_name] for field_name in field_names)) for row in rows ]
-            cursor.executemany(insert_sql, tuples)
-            cursor.commit()
+            fast_executemany = fast_executemany and _set_fast_executemany(cursor, True)
+            while True:
+                tuples = [ tuple((row[field_name] for field_name in field_names))
+                           for row in itertools.islice(rows, chunk_size) ]
+                if not tuples:
+                    break
+                if input_sizes is not None and hasattr(cursor, 'setinputsizes'):
+                    cursor.setinputsizes(input_sizes)
+                try:
+                    cursor.executemany(insert_sql, tuples)
+                except Exception as error:
+                    if not (fast_executemany and num_rows == 0) or _is_data_error(error):
+                        raise
+                    # The driver may not support array binding, retry the first chunk row by row
+                    cursor.rollback()
+                    fast_executemany = _set_fast_executemany(cursor, False)
+                    try:
+                        cursor.executemany(insert_sql, tuples)
+                    except Exception:
+                        # The chunk itself is bad, report the error of the first attempt
+                        raise error
+                num_rows += len(tuples)
+                if commit_each_chunk:
+                    cursor.commit()
+            if not commit_each_chunk:
+                cursor.commit()
         except Exception as exc:
             cursor.rollback()
             raise exc
         finally:
             dbc.autocommit = saved_autocommit
+    return num_rows
+
+
+
+def parallel_insert_rows(rows, table_name, connect_factory, workers=4, partition_size=10000, **kwargs):
+    """Insert `rows` into `table_name` over `workers` connections and return the number of inserted rows.
+
+    `connect_factory` is called with no arguments by each worker thread to open its connection,
+    and the connection is closed when the worker is done. When `connect_factory` is the bound
+    `connect` of a pool with a `max_size`, e.g. ConnectionPool, `workers` is capped at `max_size`
+    so that no worker waits for a connection held by another one.
+    The input is split into partitions of `partition_size` rows, which worker threads insert
+    with `insert_rows` and commit one by one; `kwargs` are passed to `insert_rows`.
+    At most `2 * workers` partitions are waiting in memory. A failed partition is rolled back
+    and the other partitions are still inserted, then ParallelInsertError reports the failures.
+    Partitions taken by a worker which could not connect fail with the connection error.
+    """
+    if partition_size < 1:
+        raise ValueError('partition_size must be at least 1')
+    max_size = getattr(getattr(connect_factory, '__self__', None), 'max_size', None)
+    if max_size is not None:
+        workers = min(workers, max_size)
+    if workers < 1:
+        raise ValueError('workers must be at least 1')
+    partitions = queue.Queue(maxsize=2 * workers)
+    results = []
+    threads = [threading.Thread(target=_insert_partitions,
+                                args=(partitions, results, table_name, connect_factory, kwargs))
+               for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        rows = iter(rows)
+        start = 0
+        while True:
+            partition = list(itertools.islice(rows, partition_size))
+            if not partition:
+                break
+            partitions.put((start, partition))
+            start += len(partition)
+    finally:
+        for thread in threads:
+            partitions.put(None)
+        for thread in threads:
+            thread.join()
+    num_rows = sum(result for result in results if isinstance(result, int))
+    errors = sorted((result for result in results if isinstance(result, PartitionError)),
+                    key=lambda error: error.start)
+    if errors:
+        raise ParallelInsertError(errors, num_rows)
+    return num_rows
+
+def _insert_partitions(partitions, results, table_name, connect_factory, kwargs):
+    # Each worker opens its own connection, a worker which cannot connect still takes
+    # partitions so that the producer is never blocked, and reports them as failed
+    try:
+        dbc, connect_error = connect_factory(), None
+    except Exception as exc:
+        dbc, connect_error = None, exc
+    try:
+        while True:
+            item = partitions.get()
+            if item is None:
+                return
+            start, partition = item
+            if dbc is None:
+                results.append(PartitionError(start, len(partition), connect_error))
+                continue
+            try:
+                results.append(insert_rows(partition, table_name, dbc, **kwargs))
+            except Exception as exc:
+                results.append(PartitionError(start, len(partition), exc))
+    finally:
+        if dbc is not None:
+            dbc.close()
 
+def _is_data_error(error):
+    """Return whether `error` is a DB-API error for rejected data, which a retry does not fix."""
+    return any(error_class.__name__ in ('IntegrityError', 'DataError') for error_class in type(error).__mro__)
 
+def _set_fast_executemany(cursor, enabled):
+    """Set `fast_executemany` of `cursor` if it has one, return whether it is now enabled."""
+    if not hasattr(cursor, 'fast_executemany'):
+        return False
+    cursor.fast_executemany = enabled
+    return enabled
 
 def truncate_table(table_ref, dbc):
     try:
@@ -30,11 +183,67 @@ def truncate_table(table_ref, dbc):
         raise err
 
 def convert_rows(rows, cursor, convertor=None):
-    row_class = namedtuple('Row', [d[0] for d in cursor.description])
+    column_names = _column_names(cursor)
+    row_class, view_class = _row_classes(column_names)
     if convertor is None:
         row_convertor = lambda x: row_class(*x)
     else:
-        row_convertor = lambda x: convertor(row_class(*x)._asdict())
+        row_convertor = lambda x: convertor(dict(zip(column_names, x)))
 
     result = [ row_convertor(r) for r in rows]
     return result
+
+def iter_rows(cursor, convertor=None, arraysize=None, mapping=True):
+    """Fetch the result set of `cursor` with `fetchmany` and yield one converted row at a time.
+
+    Rows are fetched in batches of `arraysize`, `cursor.arraysize` by default, so memory use
+    does not depend on the size of the result set. Without a `convertor`, rows are namedtuples.
+    Otherwise the result of `convertor` is yielded. It is called with a read-only mapping view
+    of the row by column name or, when `mapping` is False, with the fetched row itself.
+    Row classes are cached by column names and shared by cursors with the same columns.
+    """
+    row_class, view_class = _row_classes(_column_names(cursor))
+    if convertor is None:
+        row_convertor = row_class._make
+    elif mapping:
+        row_convertor = lambda row: convertor(view_class(row))
+    else:
+        row_convertor = convertor
+    arraysize = arraysize or cursor.arraysize
+    while True:
+        rows = cursor.fetchmany(arraysize)
+        if not rows:
+            return
+        yield from map(row_convertor, rows)
+
+class RowView(Mapping):
+    """Read-only mapping view of a fetched row, the base class of the views of `iter_rows`."""
+    __slots__ = ('_row',)
+    _index = {}
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, key):
+        return self._row[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+def _column_names(cursor):
+    return tuple(d[0] for d in cursor.description)
+
+@functools.lru_cache(maxsize=256)
+def _row_classes(column_names):
+    row_class = namedtuple('Row', column_names)
+    view_class = type('RowView', (RowView,), {
+        '__slots__': (),
+        '_index': {name: index for index, name in enumerate(column_names)},
+    })
+    return row_class, view_class
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+from ..pool import *
+
+
+class Test_module_pool(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.db_path = os.path.join(tmpdir.name, 'db.sqlite')
+        self.connections = []
+
+    def fix_connect(self):
+        dbc = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.connections.append(dbc)
+        return dbc
+
+    def fix_pool(self, **kwargs):
+        pool = ConnectionPool(self.fix_connect, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_checkout_reuses_released_connection(self):
+        pool = self.fix_pool(max_size=2)
+
+        with pool.checkout() as dbc:
+            dbc.execute('CREATE TABLE users (id INT)')
+        with pool.checkout() as dbc:
+            self.assertEqual([(1,)], dbc.execute('SELECT 1').fetchall())
+
+        stats = pool.stats()
+        self.assertEqual((2, 1, 1, 0), (stats.borrows, stats.created, stats.idle, stats.in_use))
+
+    def test_release_rolls_back_unfinished_transaction(self):
+        pool = self.fix_pool(max_size=1)
+        with pool.checkout() as dbc:
+            dbc.execute('CREATE TABLE users (id INT)')
+            dbc.commit()
+
+        with pool.checkout() as dbc:
+            dbc.execute('INSERT INTO users VALUES (1)')
+        with pool.checkout() as dbc:
+            self.assertEqual([], dbc.execute('SELECT id FROM users').fetchall())
+
+    def test_acquire_raises_timeout_error_given_pool_exhausted(self):
+        pool = self.fix_pool(max_size=1)
+
+        with pool.checkout():
+            with self.assertRaises(PoolTimeoutError):
+                pool.acquire(timeout=0.01)
+
+    def test_acquire_waits_for_released_connection(self):
+        pool = self.fix_pool(max_size=1)
+        dbc = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, [dbc])
+        timer.start()
+
+        with pool.checkout(timeout=5) as waited_dbc:
+            self.assertIs(dbc, waited_dbc)
+        timer.join()
+
+        stats = pool.stats()
+        self.assertEqual(1, stats.waits)
+        self.assertGreater(stats.max_wait, 0.0)
+        self.assertGreater(stats.utilization, 0.0)
+        self.assertLessEqual(stats.utilization, 1.0)
+
+    def test_broken_connection_is_replaced_on_borrow(self):
+        pool = self.fix_pool(max_size=1)
+        with pool.checkout() as dbc:
+            pass
+        dbc.close()
+
+        with pool.checkout() as new_dbc:
+            self.assertIsNot(dbc, new_dbc)
+            self.assertEqual([(1,)], new_dbc.execute('SELECT 1').fetchall())
+        self.assertEqual((2, 1), (pool.stats().created, pool.stats().discarded))
+
+    def test_idle_connection_is_closed_after_idle_timeout(self):
+        pool = self.fix_pool(idle_timeout=0.01, validate=None)
+        with pool.checkout() as dbc:
+            pass
+        time.sleep(0.02)
+
+        with pool.checkout() as new_dbc:
+            self.assertIsNot(dbc, new_dbc)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            dbc.execute('SELECT 1')
+
+    def test_connect_returns_proxy_which_releases_on_close(self):
+        pool = self.fix_pool(max_size=1)
+
+        dbc = pool.connect()
+        self.assertEqual([(1,)], dbc.execute('SELECT 1').fetchall())
+        dbc.close()
+        with pool.connect() as dbc:
+            self.assertEqual(1, pool.stats().in_use)
+        self.assertEqual((0, 1), (pool.stats().in_use, pool.stats().created))
+
+    def test_connect_proxy_commits_on_success_and_rolls_back_on_error(self):
+        pool = self.fix_pool(max_size=1)
+        with pool.checkout() as dbc:
+            dbc.execute('CREATE TABLE users (id INT)')
+            dbc.commit()
+
+        with pool.connect() as dbc:
+            dbc.execute('INSERT INTO users VALUES (1)')
+        with self.assertRaises(ValueError):
+            with pool.connect() as dbc:
+                dbc.execute('INSERT INTO users VALUES (2)')
+                raise ValueError('bad row')
+        with pool.checkout() as dbc:
+            self.assertEqual([(1,)], dbc.execute('SELECT id FROM users').fetchall())
+        self.assertEqual(0, pool.stats().in_use)
+
+    def test_close_closes_idle_connections(self):
+        pool = self.fix_pool()
+        with pool.checkout():
+            pass
+
+        pool.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            self.connections[0].execute('SELECT 1')
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
@@ -1,9 +1,47 @@
+import itertools
 import unittest
 from unittest import mock
 
+from ..pool import ConnectionPool
 from ..pyodbc_helpers import *
 
 
+class IntegrityError(Exception):
+    pass
+
+
+class FakeCursor:
+    """DB-API cursor with pyodbc's `fast_executemany`, recording how each chunk was bound."""
+    def __init__(self, fail_fast_executemany=False, fail_on=None, error_class=Exception):
+        self.fast_executemany = False
+        self.fail_fast_executemany = fail_fast_executemany
+        self.error_class = error_class
+        self.fail_on = fail_on
+        self.input_sizes = None
+        self.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def setinputsizes(self, sizes):
+        self.input_sizes = sizes
+
+    def executemany(self, sql, params):
+        if self.fast_executemany and self.fail_fast_executemany:
+            raise Exception('Driver does not support array binding')
+        if self.fail_on is not None and self.fail_on in params:
+            raise self.error_class(f'Cannot insert {self.fail_on!r}')
+        self.calls.append(('executemany', self.fast_executemany, self.input_sizes, list(params)))
+
+    def commit(self):
+        self.calls.append(('commit',))
+
+    def rollback(self):
+        self.calls.append(('rollback',))
+
 
 class Test_module_pyodbc_helpers(unittest.TestCase):
 
@@ -63,6 +101,156 @@ class Test_module_pyodbc_helpers(unittest.TestCase):
             cursor.assert_has_calls(calls)
         self.assertTrue(dbc.autocommit)
 
+    def test_insert_rows_inserts_iterable_in_chunks_and_commits_at_end(self):
+        dbc = self.fix_dbc()
+        rows = iter(self.fix_rows() * 3)
+
+        num_rows = insert_rows(rows, 'users', dbc, chunk_size=4)
+
+        self.assertEqual(6, num_rows)
+        with dbc.cursor() as cursor:
+            expect_sql = 'INSERT INTO users(id, name) VALUES (?,?)'
+            expect_tuples = self.fix_tuples() * 3
+            self.assertEqual([mock.call.executemany(expect_sql, expect_tuples[:4]),
+                              mock.call.executemany(expect_sql, expect_tuples[4:]),
+                              mock.call.commit(),], cursor.mock_calls)
+
+    def test_insert_rows_commits_each_chunk_given_commit_each_chunk(self):
+        dbc = self.fix_dbc()
+        rows = self.fix_rows() * 3
+
+        insert_rows(rows, 'users', dbc, chunk_size=4, commit_each_chunk=True)
+
+        with dbc.cursor() as cursor:
+            self.assertEqual([mock.call.executemany(mock.ANY, mock.ANY),
+                              mock.call.commit(),
+                              mock.call.executemany(mock.ANY, mock.ANY),
+                              mock.call.commit(),], cursor.mock_calls)
+
+    def fix_fake_dbc(self, cursor):
+        dbc = mock.MagicMock(spec=['cursor', 'autocommit', 'rollback'])
+        dbc.autocommit = True
+        dbc.cursor.return_value = cursor
+        return dbc
+
+    def test_insert_rows_binds_arrays_with_input_sizes_given_fast_executemany(self):
+        cursor = FakeCursor()
+        sizes = {'name': ('SQL_WVARCHAR', 128, 0), 'id': ('SQL_INTEGER', 0, 0)}
+
+        insert_rows(self.fix_rows(), 'users', self.fix_fake_dbc(cursor), fast_executemany=True, input_sizes=sizes)
+
+        expect_sizes = [('SQL_INTEGER', 0, 0), ('SQL_WVARCHAR', 128, 0)]
+        self.assertEqual([('executemany', True, expect_sizes, self.fix_tuples()),
+                          ('commit',)], cursor.calls)
+
+    def test_insert_rows_retries_without_fast_executemany_given_driver_fails(self):
+        cursor = FakeCursor(fail_fast_executemany=True)
+
+        insert_rows(self.fix_rows(), 'users', self.fix_fake_dbc(cursor), fast_executemany=True)
+
+        self.assertEqual([('rollback',),
+                          ('executemany', False, None, self.fix_tuples()),
+                          ('commit',)], cursor.calls)
+
+    def test_insert_rows_does_not_retry_given_data_error_in_fast_executemany(self):
+        cursor = FakeCursor(fail_on=(2, 'Jane'), error_class=IntegrityError)
+
+        with self.assertRaises(IntegrityError):
+            insert_rows(self.fix_rows(), 'users', self.fix_fake_dbc(cursor), fast_executemany=True)
+
+        self.assertEqual([('rollback',)], cursor.calls)
+
+    def test_insert_rows_raises_first_error_given_retry_without_fast_executemany_fails(self):
+        cursor = FakeCursor(fail_fast_executemany=True, fail_on=(2, 'Jane'))
+
+        with self.assertRaises(Exception) as exc:
+            insert_rows(self.fix_rows(), 'users', self.fix_fake_dbc(cursor), fast_executemany=True)
+
+        self.assertEqual('Driver does not support array binding', str(exc.exception))
+        self.assertEqual([('rollback',), ('rollback',)], cursor.calls)
+
+    def test_insert_rows_ignores_fast_executemany_given_cursor_without_it(self):
+        dbc = self.fix_dbc()
+
+        insert_rows(self.fix_rows(), 'users', dbc, fast_executemany=True, input_sizes=[None, None])
+
+        with dbc.cursor() as cursor:
+            cursor.assert_has_calls([mock.call.executemany(mock.ANY, self.fix_tuples()),
+                                     mock.call.commit(),])
+
+    def test_insert_rows_raises_value_error_given_non_positive_sizes(self):
+        dbc = self.fix_dbc()
+
+        with self.assertRaises(ValueError):
+            insert_rows(self.fix_rows(), 'users', dbc, chunk_size=0)
+        with self.assertRaises(ValueError):
+            parallel_insert_rows(self.fix_rows(), 'users', mock.Mock(), partition_size=0)
+        dbc.cursor.assert_not_called()
+
+    def test_insert_rows_does_nothing_given_no_rows(self):
+        dbc = self.fix_dbc()
+
+        self.assertEqual(0, insert_rows(iter([]), 'users', dbc))
+        dbc.cursor.assert_not_called()
+
+
+    def fix_connect_factory(self, cursors, **kwargs):
+        def connect():
+            cursor = FakeCursor(**kwargs)
+            cursors.append(cursor)
+            dbc = self.fix_fake_dbc(cursor)
+            dbc.close = mock.Mock()
+            return dbc
+        return connect
+
+    def fix_many_rows(self):
+        return ({'id': i, 'name': f'user {i}'} for i in range(100))
+
+    def test_parallel_insert_rows_commits_each_partition_over_worker_connections(self):
+        cursors = []
+
+        num_rows = parallel_insert_rows(self.fix_many_rows(), 'users', self.fix_connect_factory(cursors),
+                                        workers=3, partition_size=7)
+
+        self.assertEqual(100, num_rows)
+        self.assertEqual(3, len(cursors))
+        calls = [call for cursor in cursors for call in cursor.calls]
+        inserted = sorted(params for call in calls if call[0] == 'executemany' for params in call[3])
+        self.assertEqual([(i, f'user {i}') for i in range(100)], inserted)
+        self.assertEqual(15, calls.count(('commit',)))
+
+    def test_parallel_insert_rows_aggregates_partition_errors(self):
+        cursors = []
+
+        with self.assertRaises(ParallelInsertError) as exc:
+            parallel_insert_rows(self.fix_many_rows(), 'users',
+                                 self.fix_connect_factory(cursors, fail_on=(50, 'user 50')),
+                                 workers=2, partition_size=10)
+
+        self.assertEqual(90, exc.exception.num_rows)
+        self.assertEqual([(50, 10)], [(error.start, error.num_rows) for error in exc.exception.errors])
+        self.assertEqual("Cannot insert (50, 'user 50')", str(exc.exception.errors[0].error))
+
+    def test_parallel_insert_rows_caps_workers_given_pool_smaller_than_workers(self):
+        cursors = []
+        pool = ConnectionPool(self.fix_connect_factory(cursors), max_size=2, validate=None, timeout=5)
+        self.addCleanup(pool.close)
+
+        num_rows = parallel_insert_rows(self.fix_many_rows(), 'users', pool.connect, workers=4, partition_size=7)
+
+        self.assertEqual(100, num_rows)
+        self.assertEqual(2, len(cursors))
+        self.assertEqual((0, 0), (pool.stats().in_use, pool.stats().waits))
+
+    def test_parallel_insert_rows_reports_partitions_of_worker_which_cannot_connect(self):
+        connect = mock.Mock(side_effect=ConnectionError('Login failed'))
+
+        with self.assertRaises(ParallelInsertError) as exc:
+            parallel_insert_rows(self.fix_many_rows(), 'users', connect, workers=2, partition_size=10)
+
+        self.assertEqual(0, exc.exception.num_rows)
+        self.assertEqual(list(range(0, 100, 10)), [error.start for error in exc.exception.errors])
+        self.assertEqual(2, connect.call_count)
 
     def test_truncate_table_calls_proper_methods_given_database_execute_is_successful(self):
         dbc = self.fix_dbc()
@@ -100,3 +288,39 @@ class Test_module_pyodbc_helpers(unittest.TestCase):
         result = convert_rows(rows, cursor, dict)
         self.assertIsInstance(result, list)
         self.assertEqual([{'id':1, 'name': 'John'}, {'id':2, 'name':'Jane'}], result)
+
+    def fix_fetch_cursor(self, num_rows=5, arraysize=2):
+        cursor = mock.Mock(spec=['description', 'arraysize', 'fetchmany'])
+        cursor.description = [('id',), ('name',)]
+        cursor.arraysize = arraysize
+        rows = iter([(i, f'user {i}') for i in range(num_rows)])
+        cursor.fetchmany.side_effect = lambda size: list(itertools.islice(rows, size))
+        return cursor
+
+    def test_iter_rows_with_no_converter_yields_namedtuples_fetched_in_batches(self):
+        cursor = self.fix_fetch_cursor()
+
+        result = iter_rows(cursor)
+        self.assertEqual({'id': 0, 'name': 'user 0'}, next(result)._asdict())
+        cursor.fetchmany.assert_called_once_with(2)
+        self.assertEqual([1, 2, 3, 4], [row.id for row in result])
+        self.assertEqual(4, cursor.fetchmany.call_count)
+
+    def test_iter_rows_with_converter_passes_mapping_view(self):
+        cursor = self.fix_fetch_cursor(num_rows=2)
+
+        result = list(iter_rows(cursor, lambda row: (row['name'], dict(row)), arraysize=10))
+        self.assertEqual([('user 0', {'id': 0, 'name': 'user 0'}),
+                          ('user 1', {'id': 1, 'name': 'user 1'})], result)
+        cursor.fetchmany.assert_called_with(10)
+
+    def test_iter_rows_with_converter_passes_fetched_row_given_mapping_is_false(self):
+        cursor = self.fix_fetch_cursor(num_rows=2)
+
+        result = list(iter_rows(cursor, list, mapping=False))
+        self.assertEqual([[0, 'user 0'], [1, 'user 1']], result)
+
+    def test_row_class_is_shared_by_cursors_with_same_columns(self):
+        first = next(iter_rows(self.fix_fetch_cursor()))
+        second = convert_rows([(1, 'John')], self.fix_fetch_cursor())[0]
+        self.assertIs(type(first), type(second))
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 import pytest
 from transform.transformations import *
@@ -10,3 +11,47 @@ class TestDataTransformer(unittest.TestCase):
         expect = dict(id=1,name='John')
         self.assertEqual(expect, result)
 
+
+    def test_select_with_field_list(self):
+        input = dict(id=1,name='John',age=65)
+        selector = select(['name', 'age'])
+        result = selector(input)
+        expect = dict(name='John',age=65)
+        self.assertEqual(expect, result)
+
+    def test_select_with_single_field(self):
+        result = select('name')(dict(id=1,name='John'))
+        self.assertEqual(dict(name='John'), result)
+
+    def test_select_returns_compact_record(self):
+        result = select('id,name')(dict(id=1,name='John',age=65))
+        self.assertIsInstance(result, Record)
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertEqual(['id', 'name'], list(result))
+        self.assertEqual(dict(id=1,name='John'), dict(result))
+
+    def test_select_record_supports_field_update(self):
+        result = update_field('name', str.upper)(select('id,name')(dict(id=1,name='John')))
+        self.assertEqual(dict(id=1,name='JOHN'), result)
+
+    def test_select_record_supports_adding_and_deleting_fields(self):
+        result = select('id,name')(dict(id=1,name='John'))
+        result['age'] = 65
+        del result['name']
+        self.assertEqual(dict(id=1,age=65), result)
+        with self.assertRaises(KeyError):
+            result['name']
+
+    def test_select_record_and_transformation_can_be_pickled(self):
+        selector = select('id,name')
+        result = selector(dict(id=1,name='John'))
+        result['age'] = 65
+        self.assertIs(selector, pickle.loads(pickle.dumps(selector)))
+        self.assertIs(Record, pickle.loads(pickle.dumps(Record)))
+        restored = pickle.loads(pickle.dumps(result))
+        self.assertIs(selector, type(restored))
+        self.assertEqual(dict(id=1,name='John',age=65), restored)
+
+    def test_select_with_missing_field_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            select('id,age')(dict(id=1,name='John'))
@@ -1,9 +1,39 @@
+import array
+import copy
+import io
+import json
+import os
+import pickle
+import queue
+import tempfile
 import unittest
 import pytest
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # For compatibility with Databricks notebook mode
 if 'DataTransformer' not in globals().keys():
     from transform.transformer import DataTransformer, SkipRowInfo,RuleErrorInfo, SkipReason
+    from transform.transformations import select
+
+def upper_short_name(row):
+    if len(row['name']) > 5:
+        raise ValueError("'name' length exceeds 5 characters")
+    row['name'] = row['name'].upper()
+    return row
+
+def add_double_score(row):
+    row['double_score'] = row['score'] * 2
+    return row
+
+def positive(value):
+    if value < 0:
+        raise ValueError('negative value')
+    return value
+
 
 class TestDataTransformer(unittest.TestCase):
     def test_execute_Transformer_class_returns_instance(self):
@@ -134,3 +164,460 @@ class TestDataTransformer(unittest.TestCase):
 
         result = transformer.apply(data)
         self.assertEqual(expect, result)
+
+
+    def fix_failing_transformer(self):
+        def upper(row):
+            if len(row['name']) > 5:
+                raise ValueError("'name' length exceeds 5 characters")
+            row['name'] = row['name'].upper()
+            return row
+        return DataTransformer().id('id').transform(upper, 'upper-name')
+
+    def test_apply_iter_yields_transformed_rows_and_counts(self):
+        data = [ {'id': 1, 'name': 'Long John'}, {'id': 2, 'name': 'Jane'}]
+        transformer = self.fix_failing_transformer()
+
+        result = transformer.apply_iter(data)
+        assert {'id': 2, 'name': 'JANE'} == next(result)
+        assert [] == list(result)
+        assert 2 == transformer.num_input
+        assert 1 == transformer.num_output
+        assert 1 == transformer.num_skipped
+        assert 1 == transformer.num_errored
+        assert 1 == transformer.num_errors
+        assert [] == transformer.skipped
+        assert [] == transformer.output
+
+    def test_apply_iter_calls_callable_skip_sink(self):
+        data = [ {'id': 1, 'name': 'Long John'}, {'id': 2, 'name': 'Jane'}]
+        skipped = []
+        transformer = self.fix_failing_transformer()
+
+        list(transformer.apply_iter(data, skipped.append))
+        expect_error_info = RuleErrorInfo(rule_name='upper-name',
+                                       error_type=ValueError.__name__,
+                                       error_text="'name' length exceeds 5 characters")
+        expect_skip = [SkipRowInfo(row_id=1,
+                                   reason=SkipReason.ERROR,
+                                   errors=[expect_error_info],
+                                   row={'id': 1, 'name': 'Long John'})]
+        self.assertEqual(expect_skip, skipped)
+
+    def test_apply_iter_puts_skipped_rows_to_queue_sink(self):
+        data = [ {'id': 1, 'name': 'Long John'}, {'id': 2, 'name': 'Jane'}]
+        sink = queue.Queue()
+        transformer = self.fix_failing_transformer()
+
+        list(transformer.apply_iter(data, sink))
+        assert 1 == sink.get_nowait().row_id
+        assert sink.empty()
+
+    def test_apply_iter_writes_skipped_rows_to_file_sink(self):
+        data = [ {'id': 1, 'name': 'Long John'}, {'id': 2, 'name': 'Jane'}]
+        sink = io.StringIO()
+        transformer = self.fix_failing_transformer()
+
+        list(transformer.apply_iter(data, sink))
+        expect = {'row_id': 1,
+                  'reason': 'ERROR',
+                  'errors': [{'rule_name': 'upper-name',
+                              'error_type': 'ValueError',
+                              'error_text': "'name' length exceeds 5 characters"}],
+                  'row': {'id': 1, 'name': 'Long John'}}
+        self.assertEqual([expect], [json.loads(line) for line in sink.getvalue().splitlines()])
+
+    def fix_parallel_data(self):
+        return [{'id': i, 'name': 'x' * (i % 8), 'score': i % 5 - 1} for i in range(50)]
+
+    def test_apply_with_workers_returns_same_results_as_serial(self):
+        def fix_transformer():
+            return (DataTransformer()
+                    .transform(upper_short_name, 'upper-name')
+                    .transform_field('score', positive, 'positive-score'))
+        serial = fix_transformer()
+        parallel = fix_transformer()
+
+        expect = serial.apply(self.fix_parallel_data())
+        result = parallel.apply(self.fix_parallel_data(), workers=2, chunk_size=7)
+        assert expect == result
+        assert serial.skipped == parallel.skipped
+        assert 50 == parallel.num_input
+        assert serial.num_errored == parallel.num_errored
+        assert serial.num_errors == parallel.num_errors
+        assert serial.num_output == parallel.num_output
+
+    def test_copied_transformer_keeps_results(self):
+        transformer = DataTransformer().transform(upper_short_name, 'upper-name')
+        transformer.apply(self.fix_parallel_data())
+
+        for copied in (copy.copy(transformer), copy.deepcopy(transformer)):
+            assert transformer.output == copied.output
+            assert transformer.skipped == copied.skipped
+
+    def test_apply_iter_with_workers_uses_row_id_getter(self):
+        skipped = []
+        transformer = DataTransformer().id('id').transform(upper_short_name, 'upper-name')
+
+        result = list(transformer.apply_iter(self.fix_parallel_data(), skipped.append, workers=2, chunk_size=4))
+        assert [i for i in range(50) if i % 8 <= 5] == [row['id'] for row in result]
+        assert [i for i in range(50) if i % 8 > 5] == [skip_info.row_id for skip_info in skipped]
+
+    def test_apply_columns_transforms_columns_and_skips_errored_rows(self):
+        batches = [{'id': [1, 2], 'score': [3, -1]}, {'id': [3], 'score': [0]}]
+        skipped = []
+        transformer = DataTransformer().transform_field('score', positive, 'positive-score')
+
+        result = list(transformer.apply_columns(batches, skipped.append))
+        assert [{'id': [1], 'score': [3]}, {'id': [3], 'score': [0]}] == result
+        expect_error_info = RuleErrorInfo(rule_name='positive-score',
+                                          error_type=ValueError.__name__,
+                                          error_text='negative value')
+        expect_skip = [SkipRowInfo(row_id=1,
+                                   reason=SkipReason.ERROR,
+                                   errors=[expect_error_info],
+                                   row={'id': 2, 'score': -1})]
+        self.assertEqual(expect_skip, skipped)
+        assert 3 == transformer.num_input
+        assert 2 == transformer.num_output
+        assert 1 == transformer.num_errors
+
+    def test_apply_columns_calls_vectorized_rule_once_per_column(self):
+        calls = []
+        def double(values):
+            calls.append(values)
+            return [value * 2 for value in values]
+        transformer = DataTransformer().transform_field('score', double, vectorized=True)
+
+        result = list(transformer.apply_columns([{'score': [1, 2, 3]}]))
+        assert [{'score': [2, 4, 6]}] == result
+        assert [[1, 2, 3]] == calls
+
+    def test_apply_columns_finds_failing_rows_of_vectorized_rule(self):
+        def checked_sqrt(values):
+            if isinstance(values, list):
+                return [checked_sqrt(value) for value in values]
+            return positive(values) ** 0.5
+        transformer = DataTransformer().id('id').transform_field('score', checked_sqrt, vectorized=True)
+
+        result = list(transformer.apply_columns([{'id': [7, 8, 9], 'score': [4, -1, 9]}]))
+        assert [{'id': [7, 9], 'score': [2.0, 3.0]}] == result
+        assert 1 == transformer.num_skipped
+
+    @pytest.mark.skipif(np is None, reason='NumPy is not installed')
+    def test_apply_columns_with_numpy_columns(self):
+        transformer = DataTransformer().transform_field('score', np.sqrt, vectorized=True)
+
+        batch, = transformer.apply_columns([{'score': np.array([4.0, 9.0])}])
+        assert [2.0, 3.0] == batch['score'].tolist()
+
+    @pytest.mark.skipif(np is None, reason='NumPy is not installed')
+    def test_apply_columns_with_row_rule_on_numpy_columns_takes_result_dtype(self):
+        transformer = (DataTransformer()
+                       .transform_field('score', float, 'to-float')
+                       .transform_field('count', lambda value: value / 2, 'halve'))
+
+        batch, = transformer.apply_columns([{'score': np.array(['1.5', '2', 'x']), 'count': np.array([1, 3, 5])}])
+        assert [1.5, 2.0] == batch['score'].tolist()
+        assert [0.5, 1.5] == batch['count'].tolist()
+        assert np.float64 == batch['score'].dtype == batch['count'].dtype
+
+    def test_apply_columns_with_row_rule_on_immutable_columns(self):
+        transformer = DataTransformer().transform_field('score', positive, 'positive-score')
+
+        batch, = transformer.apply_columns([{'score': array.array('q', [1, -2, 3]), 'id': (1, 2, 3)}])
+        assert [1, 3] == list(batch['score'])
+        assert [1, 3] == list(batch['id'])
+        assert 1 == transformer.num_errors
+
+    def test_apply_columns_rejects_row_rules(self):
+        transformer = DataTransformer().transform(upper_short_name, 'upper-name')
+
+        with self.assertRaises(ValueError):
+            list(transformer.apply_columns([{'name': ['John']}]))
+
+    def test_compile_returns_row_function_collecting_errors(self):
+        transformer = (DataTransformer()
+                       .transform(upper_short_name, 'upper-name')
+                       .transform_field('score', positive, 'positive-score'))
+        transform_row = transformer.compile()
+
+        assert ({'name': 'JOHN', 'score': 1}, None) == transform_row({'name': 'John', 'score': 1})
+        row, errors = transform_row({'name': 'Long John', 'score': -1})
+        assert {'name': 'Long John', 'score': -1} == row
+        assert ['upper-name', 'positive-score'] == [error.rule_name for error in errors]
+
+    def test_compile_caches_function_until_rules_change(self):
+        transformer = DataTransformer().transform(upper_short_name)
+        transform_row = transformer.compile()
+        assert transform_row is transformer.compile()
+
+        transformer.transform_field('score', positive)
+        assert transform_row is not transformer.compile()
+
+    def test_instrumented_apply_collects_rule_stats(self):
+        transformer = (DataTransformer()
+                       .instrument()
+                       .transform(upper_short_name, 'upper-name')
+                       .transform_field('score', positive, 'positive-score'))
+
+        transformer.apply([{'name': 'Long John', 'score': 1}, {'name': 'Jane', 'score': -1}, {'name': 'Bob', 'score': 2}])
+        upper_stats, positive_stats = transformer.rule_stats()
+        assert 'upper-name' == upper_stats.name
+        assert 3 == upper_stats.invocations
+        assert {'ValueError': 1} == upper_stats.errors
+        assert 1 / 3 == upper_stats.error_rate
+        assert 3 == sum(upper_stats.histogram.values())
+        assert upper_stats.total_time > 0
+        assert 3 == positive_stats.invocations
+        assert 1 == positive_stats.num_errors
+
+    def test_instrumented_apply_resets_rule_stats(self):
+        transformer = DataTransformer().instrument().transform_field('score', positive)
+
+        transformer.apply([{'score': 1}])
+        transformer.apply([{'score': 2}])
+        assert [1] == [rule_stats.invocations for rule_stats in transformer.rule_stats()]
+
+    def test_instrumented_apply_with_workers_merges_rule_stats(self):
+        transformer = DataTransformer().instrument().transform(upper_short_name, 'upper-name')
+
+        transformer.apply(self.fix_parallel_data(), workers=2, chunk_size=7)
+        rule_stats, = transformer.rule_stats()
+        assert 50 == rule_stats.invocations
+        assert transformer.num_errors == rule_stats.num_errors
+
+    def test_rule_stats_report_is_a_dictionary(self):
+        transformer = DataTransformer().instrument().transform_field('score', positive, 'positive-score')
+
+        list(transformer.apply_columns([{'score': [1, -1]}]))
+        report = transformer.rule_stats()[0].as_dict()
+        assert 'positive-score' == report['name']
+        assert 2 == report['invocations']
+        assert {'ValueError': 1} == report['errors']
+        assert 0.5 == report['error_rate']
+
+    def test_rule_stats_are_empty_unless_instrumented(self):
+        transformer = DataTransformer().transform_field('score', positive)
+
+        transformer.apply([{'score': 1}])
+        assert [] == transformer.rule_stats()
+
+    def test_fail_fast_stops_applying_rules_after_first_error(self):
+        calls = []
+        def record(row):
+            calls.append(row['name'])
+            return row
+        transformer = (DataTransformer()
+                       .fail_fast()
+                       .transform(upper_short_name, 'upper-name')
+                       .transform_field('score', positive, 'positive-score')
+                       .transform(record, 'record'))
+
+        result = transformer.apply([{'name': 'Long John', 'score': -1}, {'name': 'Jane', 'score': 1}])
+        assert [{'name': 'JANE', 'score': 1}] == result
+        assert ['JANE'] == calls
+        assert [['upper-name']] == [[error.rule_name for error in skip_info.errors] for skip_info in transformer.skipped]
+        assert 1 == transformer.num_errors
+
+    def test_rule_is_skipped_when_dependency_failed(self):
+        calls = []
+        def double(value):
+            calls.append(value)
+            return value * 2
+        transformer = (DataTransformer()
+                       .transform_field('score', positive, 'positive-score')
+                       .transform_field('score', double, 'double-score', depends_on='positive-score')
+                       .transform_field('score', double, 'double-again', depends_on=['double-score'])
+                       .transform(upper_short_name, 'upper-name'))
+
+        result = transformer.apply([{'name': 'Long John', 'score': -1}, {'name': 'Jane', 'score': 1}])
+        assert [{'name': 'JANE', 'score': 4}] == result
+        assert [1, 2] == calls
+        assert [['positive-score', 'upper-name']] == [[error.rule_name for error in skip_info.errors]
+                                                      for skip_info in transformer.skipped]
+
+    def test_transform_rejects_unknown_dependency(self):
+        with self.assertRaises(ValueError):
+            DataTransformer().transform(upper_short_name, 'upper-name', depends_on='missing')
+
+    def test_apply_columns_skips_rules_with_failed_dependency(self):
+        calls = []
+        def double(value):
+            calls.append(value)
+            return value * 2
+        transformer = (DataTransformer()
+                       .transform_field('score', positive, 'positive-score')
+                       .transform_field('score', double, 'double-score', depends_on='positive-score'))
+
+        result = list(transformer.apply_columns([{'score': [-1, 1]}]))
+        assert [{'score': [2]}] == result
+        assert [1] == calls
+
+    def test_apply_columns_with_fail_fast_reports_first_error_only(self):
+        transformer = (DataTransformer()
+                       .fail_fast()
+                       .transform_field('score', positive, 'positive-score')
+                       .transform_field('score', positive, 'positive-again'))
+
+        list(transformer.apply_columns([{'score': [-1, 1]}]))
+        assert 1 == transformer.num_errors
+
+    def fix_checkpoint_path(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return os.path.join(directory.name, 'apply.checkpoint')
+
+    def fix_checkpoint_transformer(self, seen, crash_at=None):
+        def track(row):
+            if row['id'] == crash_at:
+                raise KeyboardInterrupt
+            seen.append(row['id'])
+            return row
+        return (DataTransformer()
+                .transform(track, 'track')
+                .transform(upper_short_name, 'upper-name')
+                .transform_field('score', positive, 'positive-score'))
+
+    def test_apply_with_checkpoint_resumes_after_interruption(self):
+        checkpoint = self.fix_checkpoint_path()
+        expect_transformer = self.fix_checkpoint_transformer([])
+        expect = expect_transformer.apply(self.fix_parallel_data())
+
+        seen = []
+        with pytest.raises(KeyboardInterrupt):
+            self.fix_checkpoint_transformer(seen, crash_at=23).apply(
+                self.fix_parallel_data(), checkpoint=checkpoint, checkpoint_every=10)
+        assert list(range(23)) == seen
+        assert os.path.exists(checkpoint)
+
+        seen = []
+        transformer = self.fix_checkpoint_transformer(seen)
+        result = transformer.apply(iter(self.fix_parallel_data()), checkpoint=checkpoint, checkpoint_every=10)
+        assert list(range(20, 50)) == seen
+        assert expect == result
+        assert expect_transformer.skipped == transformer.skipped
+        assert 50 == transformer.num_input
+        assert expect_transformer.num_output == transformer.num_output
+        assert expect_transformer.num_errors == transformer.num_errors
+        assert not os.path.exists(checkpoint)
+
+    def test_apply_with_checkpoint_ignores_truncated_record(self):
+        checkpoint = self.fix_checkpoint_path()
+        with pytest.raises(KeyboardInterrupt):
+            self.fix_checkpoint_transformer([], crash_at=35).apply(
+                self.fix_parallel_data(), checkpoint=checkpoint, checkpoint_every=10)
+        with open(checkpoint, 'r+b') as file:
+            file.truncate(os.path.getsize(checkpoint) - 5)
+
+        seen = []
+        result = self.fix_checkpoint_transformer(seen).apply(
+            self.fix_parallel_data(), checkpoint=checkpoint, checkpoint_every=10)
+        assert list(range(20, 50)) == seen
+        assert self.fix_checkpoint_transformer([]).apply(self.fix_parallel_data()) == result
+
+    def test_apply_with_checkpoint_and_workers_returns_same_results(self):
+        checkpoint = self.fix_checkpoint_path()
+        transformer = (DataTransformer()
+                       .transform(upper_short_name, 'upper-name')
+                       .transform_field('score', positive, 'positive-score'))
+
+        expect = transformer.apply(self.fix_parallel_data())
+        expect_skipped = transformer.skipped
+        result = transformer.apply(self.fix_parallel_data(), workers=2, chunk_size=4,
+                                   checkpoint=checkpoint, checkpoint_every=15)
+        assert expect == result
+        assert expect_skipped == transformer.skipped
+        assert not os.path.exists(checkpoint)
+
+    def test_drop_skipped_rows_keeps_row_id_only(self):
+        transformer = DataTransformer().drop_skipped_rows().transform(upper_short_name, 'upper-name')
+
+        transformer.apply(self.fix_parallel_data())
+        assert [i for i in range(50) if i % 8 > 5] == [skip_info.row_id for skip_info in transformer.skipped]
+        assert all(skip_info.row is None for skip_info in transformer.skipped)
+
+    def test_skipped_rows_share_error_strings(self):
+        transformer = DataTransformer().transform(upper_short_name, 'upper-name')
+
+        transformer.apply(self.fix_parallel_data(), workers=2, chunk_size=4)
+        first, second = transformer.skipped[0].errors[0], transformer.skipped[-1].errors[0]
+        assert first.rule_name is second.rule_name
+        assert first.error_type is second.error_type
+
+    def test_skip_info_records_behave_like_tuples(self):
+        error_info = RuleErrorInfo(rule_name='r', error_type='ValueError', error_text='bad')
+        skip_info = SkipRowInfo(row_id=1, reason=SkipReason.ERROR, errors=[error_info], row=None)
+
+        assert ('r', 'ValueError', 'bad') == tuple(error_info)
+        assert {'rule_name': 'r', 'error_type': 'ValueError', 'error_text': 'bad'} == error_info._asdict()
+        assert "RuleErrorInfo(rule_name='r', error_type='ValueError', error_text='bad')" == repr(error_info)
+        assert skip_info == pickle.loads(pickle.dumps(skip_info))
+        assert not hasattr(skip_info, '__dict__')
+
+    def test_cached_field_rule_is_called_once_per_value(self):
+        calls = []
+        def country_name(code):
+            calls.append(code)
+            return {'bg': 'Bulgaria', 'de': 'Germany'}[code]
+        data = [{'country': code} for code in ['bg', 'de', 'bg', 'bg', 'de']]
+        transformer = DataTransformer().transform_field('country', country_name, 'country-name', cache=16)
+
+        result = transformer.apply(data)
+        assert ['Bulgaria', 'Germany', 'Bulgaria', 'Bulgaria', 'Germany'] == [row['country'] for row in result]
+        assert ['bg', 'de'] == calls
+        info = transformer.cache_stats()[0]
+        assert ('country-name', 3, 2, 16, 2) == (info.name, info.hits, info.misses, info.maxsize, info.currsize)
+
+    def test_cached_field_rule_keeps_equal_values_of_different_types_apart(self):
+        data = [{'v': 1}, {'v': True}, {'v': 1.0}]
+        transformer = DataTransformer().transform_field('v', str, 'to-str', cache=8)
+
+        result = transformer.apply(data)
+        assert ['1', 'True', '1.0'] == [row['v'] for row in result]
+        assert 3 == transformer.cache_stats()[0].misses
+
+    def test_cached_field_rule_raising_type_error_is_called_once_per_row(self):
+        calls = []
+        def to_int(value):
+            calls.append(value)
+            return int(value)
+        transformer = DataTransformer().transform_field('v', to_int, 'to-int', cache=8)
+
+        result = transformer.apply([{'v': None}, {'v': '1'}, {'v': None}])
+        assert [{'v': 1}] == result
+        assert [None, '1', None] == calls
+        assert ['TypeError', 'TypeError'] == [skip_info.errors[0].error_type for skip_info in transformer.skipped]
+        assert (3, 0) == (transformer.cache_stats()[0].misses, transformer.cache_stats()[0].uncached)
+
+    def test_cached_field_rule_does_not_cache_errors_and_unhashable_values(self):
+        transformer = (DataTransformer()
+                       .transform_field('score', positive, 'positive-score', cache=4)
+                       .transform_field('tags', len, 'count-tags', cache=4))
+
+        result = transformer.apply([{'score': -1, 'tags': []}, {'score': -1, 'tags': []}, {'score': 1, 'tags': ['a']}])
+        assert [{'score': 1, 'tags': 1}] == result
+        assert 2 == transformer.num_errors
+        score_info, tags_info = transformer.cache_stats()
+        assert (0, 3) == (score_info.hits, score_info.misses)
+        assert (0, 0, 3) == (tags_info.hits, tags_info.misses, tags_info.uncached)
+
+    def test_cached_field_rule_with_workers_returns_same_results(self):
+        transformer = DataTransformer().transform_field('score', positive, 'positive-score', cache=2)
+
+        expect = transformer.apply(self.fix_parallel_data())
+        result = transformer.apply(self.fix_parallel_data(), workers=2, chunk_size=7)
+        assert expect == result
+
+    def test_apply_with_select_rule_in_workers_and_checkpoint(self):
+        def fix_transformer():
+            return (DataTransformer()
+                    .transform(select('id,score'), 'select')
+                    .transform_field('score', positive, 'positive-score')
+                    .transform(add_double_score, 'add-double-score'))
+        expect = fix_transformer().apply(self.fix_parallel_data())
+        assert {'id': 1, 'score': 0, 'double_score': 0} == expect[0]
+
+        result = fix_transformer().apply(self.fix_parallel_data(), workers=2, chunk_size=7,
+                                         checkpoint=self.fix_checkpoint_path(), checkpoint_every=20)
+        assert expect == result
@@ -1,16 +1,119 @@
+import abc
+import copyreg
+import functools
+import operator
+from collections.abc import MutableMapping
+
+
+class RecordType(abc.ABCMeta):
+    """Metaclass of Record classes, which are pickled by their field names."""
+
+class Record(MutableMapping, metaclass=RecordType):
+    """Base class of compact records created by `record_type`.
+
+    A record is a mutable mapping whose fields are kept in `__slots__`, so a record does not
+    allocate a dictionary. Fields which are not in the record type, e.g. added by a later rule,
+    are kept in a dictionary allocated on first use. Records are pickled by field names and values.
+    """
+    __slots__ = ('_extra',)
+    _fields = ()
+    _slots = {}
+
+    def __getitem__(self, key):
+        slot = self._slots.get(key)
+        try:
+            if slot is None:
+                return self._extra[key]
+            return getattr(self, slot)
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        slot = self._slots.get(key)
+        if slot is not None:
+            setattr(self, slot, value)
+            return
+        try:
+            self._extra[key] = value
+        except AttributeError:
+            self._extra = {key: value}
+
+    def __delitem__(self, key):
+        slot = self._slots.get(key)
+        try:
+            if slot is None:
+                del self._extra[key]
+            else:
+                delattr(self, slot)
+        except (AttributeError, KeyError):
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for field_name, slot in self._slots.items():
+            if hasattr(self, slot):
+                yield field_name
+        yield from getattr(self, '_extra', ())
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+    def __reduce__(self):
+        return _restore_record, (self._fields, dict(self))
+
+def record_type(field_names):
+    """Return the Record class which takes the values of `field_names` from a row when instantiated.
+
+    Classes are cached, so equal field names give the same class.
+    """
+    return _record_type(tuple(field_names))
+
+@functools.lru_cache(maxsize=None)
+def _record_type(field_names):
+    if not field_names:
+        raise ValueError('At least one field name is required')
+    slots = tuple(f'_{index}' for index in range(len(field_names)))
+    targets = ', '.join(f'self.{slot}' for slot in slots)
+    namespace = {'getter': operator.itemgetter(*field_names)}
+    exec(f'def __init__(self, row):\n    {targets} = getter(row)', namespace)
+    return RecordType('Record', (Record,), {
+        '__slots__': slots,
+        '__init__': namespace['__init__'],
+        '__module__': __name__,
+        '_fields': field_names,
+        '_slots': dict(zip(field_names, slots)),
+    })
+
+def _restore_record(field_names, values):
+    record_class = _record_type(field_names)
+    record = record_class.__new__(record_class)
+    for key, value in values.items():
+        record[key] = value
+    return record
+
+def _reduce_record_type(record_class):
+    if not record_class._fields:
+        # The Record base class is pickled by name
+        return record_class.__qualname__
+    return _record_type, (record_class._fields,)
+
+copyreg.pickle(RecordType, _reduce_record_type)
+
 def select(field_list):
-    def select_transformation(row):
-        result = {}
-        for f in _field_list:
-            result[f] = row[f]
-        return result
+    """Create a transformation which projects a row on the fields in `field_list`.
+
+    `field_list` is a list of field names or a comma separated string of field names.
+    The transformation is the Record class itself, so calling it with a row returns a
+    record which refers to the values of the row.
+    """
     if isinstance(field_list, str):
-        _field_list = [field_name.strip() for field_name in field_list.split(',')]
-    return select_transformation
+        field_list = [field_name.strip() for field_name in field_list.split(',')]
+    return record_type(field_list)
 
 def update_field(field_name, func):
     def update_field_transformation(row):
         row[field_name] = func(row[field_name])
         return row
     return update_field_transformation
-
@@ -1,9 +1,67 @@
+import collections
+import collections.abc
+import concurrent.futures
+import copy
+import functools
+import itertools
+import json
+import operator
+import os
+import pickle
+import time
 from collections import namedtuple
 from enum import Enum
 
-RuleInfo = namedtuple('RuleInfo', 'name,rule')
-RuleErrorInfo = namedtuple('RuleErrorInfo', 'rule_name,error_type,error_text')
-SkipRowInfo = namedtuple('SkipRowInfo', 'row_id,reason,errors,row')
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RuleInfo = namedtuple('RuleInfo', 'name,rule,depends_on', defaults=(None,))
+CacheInfo = namedtuple('CacheInfo', 'name,hits,misses,uncached,maxsize,currsize')
+MAX_INTERNED_STRINGS = 10000
+
+class _Info:
+    """Base class of compact records with the fields in `__slots__`.
+
+    Records are built with keywords and compare, print and iterate like namedtuples.
+    """
+    __slots__ = ()
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={value!r}' for name, value in zip(self.__slots__, self))
+        return f'{type(self).__name__}({fields})'
+
+    def _asdict(self):
+        return dict(zip(self.__slots__, self))
+
+class RuleErrorInfo(_Info):
+    __slots__ = ('rule_name', 'error_type', 'error_text')
+
+    def __init__(self, rule_name, error_type, error_text):
+        self.rule_name = rule_name
+        self.error_type = error_type
+        self.error_text = error_text
+
+class SkipRowInfo(_Info):
+    __slots__ = ('row_id', 'reason', 'errors', 'row')
+
+    def __init__(self, row_id, reason, errors, row):
+        self.row_id = row_id
+        self.reason = reason
+        self.errors = errors
+        self.row = row
 
 class SkipReason(Enum):
     ERROR = 'ERROR'
@@ -12,13 +70,19 @@ class DataTransformer():
     def __init__(self):
         self.rules = []
         self._id = None
+        self._compiled = None
+        self._compiled_rules = None
+        self._rule_stats = None
+        self._fail_fast = False
+        self._drop_skipped_rows = False
+        self._strings = {}
         self._init()
 
     @property
     def num_skipped(self):
         """Returns the number of rows skipped by the `apply` method.
         """
-        return len(self.skipped)
+        return self._num_skipped
 
     @property
     def errored(self):
@@ -30,25 +94,43 @@ class DataTransformer():
     def num_errored(self):
         """Returns the number of rows with `apply` error.
         """
-        return len(self.errored)
+        return self._num_errored
 
     @property
     def num_errors(self):
         """Returns the total number of errors during `apply`.
         """
-        return sum(map(lambda skip_info: len(skip_info.errors), self.skipped))
+        return self._num_errors
 
     @property
     def num_output(self):
-        """Returns the number of errors returned by `apply` method."""
-        return len(self.output)
+        """Returns the number of rows returned by `apply` method."""
+        return self._num_output
+
 
+    def _worker_copy(self):
+        """Return a copy of the transformer to send to worker processes."""
+        worker = copy.copy(self)
+        # Results are not needed to transform rows in a worker process
+        worker.output = []
+        worker.skipped = []
+        worker._strings = {}
+        # Generated functions cannot be pickled, workers compile their own
+        worker._compiled = None
+        worker._compiled_rules = None
+        return worker
 
     def _init(self):
         """Initialize the transformer before applying the transformations."""
         self.skipped = []
         self.output = []
         self.num_input = 0
+        self._num_output = 0
+        self._num_skipped = 0
+        self._num_errored = 0
+        self._num_errors = 0
+        for rule_stats in self._rule_stats or ():
+            rule_stats.reset()
 
     def id(self, getter):
         """Set the row identifier.
@@ -61,38 +143,106 @@ class DataTransformer():
         if callable(getter):
             self._id = getter
         else:
-            self._id = lambda row: row[getter]
+            self._id = operator.itemgetter(getter)
+        return self
+
+    def instrument(self, enabled=True):
+        """Enable or disable collection of per-rule statistics during `apply`.
+
+        See `rule_stats`. Statistics are reset at the start of each `apply`.
+        """
+        self._rule_stats = [] if enabled else None
+        self._compiled = None
+        return self
+
+    def rule_stats(self):
+        """Returns a list of RuleStats, one for each rule in registration order.
+
+        The list is empty unless the transformer is instrumented.
+        """
+        return list(self._rule_stats or ())
+
+    def fail_fast(self, enabled=True):
+        """Stop applying rules to a row after its first error.
+
+        The row is skipped with a single RuleErrorInfo for the failed rule.
+        """
+        self._fail_fast = enabled
+        self._compiled = None
         return self
 
-    def transform(self, rule, name=None):
+    def drop_skipped_rows(self, enabled=True):
+        """Keep only the row id of skipped rows, the `row` of their SkipRowInfo is None."""
+        self._drop_skipped_rows = enabled
+        return self
+
+    def transform(self, rule, name=None, depends_on=None):
         """Append a row transformation.
 
         Row transformation is a function/callable which takes one argument - `row`
         and returns the transformed row.
+
+        `depends_on` is a rule name or a list of names of previously registered rules.
+        The rule is not applied to a row if any of those rules failed or was not applied.
         """
-        rule = RuleInfo(name=name, rule=rule)
+        if depends_on is not None:
+            depends_on = (depends_on,) if isinstance(depends_on, str) else tuple(depends_on)
+            known_names = {rule_info.name for rule_info in self.rules if rule_info.name is not None}
+            unknown_names = [name for name in depends_on if name not in known_names]
+            if unknown_names:
+                raise ValueError(f'Unknown rule dependencies: {unknown_names}')
+        rule = RuleInfo(name=name, rule=rule, depends_on=depends_on)
         self.rules.append(rule)
         return self
     
-    def transform_field(self, field_name, rule, name=None):
+    def cache_stats(self):
+        """Returns a list of CacheInfo, one for each field rule registered with a `cache`.
+
+        In parallel mode the rules are called, and their caches filled, in the worker processes.
+        """
+        return [rule_info.rule.rule.cache_info(rule_info.name) for rule_info in self.rules
+                if isinstance(rule_info.rule, FieldRule) and isinstance(rule_info.rule.rule, CachedRule)]
+
+    def transform_field(self, field_name, rule, name=None, vectorized=False, depends_on=None, cache=None):
         """Append a field transformation.
 
         Field transformation is a function/callable which takes one argument - `value` - 
         the value of the input field with name `field_name` and returns the new value for that field.
+
+        A `vectorized` rule is called by `apply_columns` with a whole column, e.g. a NumPy array,
+        and returns the new column. It must also accept a single value, which is how it is called
+        when a row is transformed and when a column fails, to find the failing rows.
+
+        `depends_on` is the same as for `transform`.
+
+        `cache` is the maximum number of values whose results are kept in an LRU cache, so the
+        rule is not called again for a repeated value. Use it for pure rules over low-cardinality
+        fields. Unhashable values, e.g. whole columns, are not cached. See `cache_stats`.
         """ 
-        def field_transformer(row):
-            row[field_name] = rule(row[field_name])
-            return row
-        return self.transform(field_transformer, name)
+        if cache:
+            rule = CachedRule(rule, cache)
+        return self.transform(FieldRule(field_name, rule, vectorized), name, depends_on)
 
 
-    def apply(self, dataset):
+    def apply(self, dataset, workers=None, chunk_size=1000, checkpoint=None, checkpoint_every=100000):
         """Apply all defined transformations to an iterable `dataset`.
 
         Parameters
         ----------
            :dataset:iterable: a collection or other iterable holidng input rows.
                               Each row is a dictionary-like object (`dict()` is used to clone rows).
+           :workers:int: when given, chunks of `chunk_size` input rows are transformed in a pool
+                         of `workers` processes. Rules and the row id getter must be picklable,
+                         e.g. module-level functions. Output rows, skipped rows and counters
+                         are the same as in serial mode, in input order.
+           :chunk_size:int: the number of input rows sent to a worker process at once.
+           :checkpoint:str: path of a checkpoint file. Every `checkpoint_every` input rows the
+                            offset, the counters and the new output and skipped rows are appended
+                            to the file. If the file exists, `apply` resumes from it: the saved
+                            results are restored and the first `offset` rows of `dataset` are
+                            skipped, so `dataset` must yield the same rows as the interrupted run.
+                            The file is removed when `apply` completes.
+           :checkpoint_every:int: the number of input rows between two checkpoints.
 
         Retruns
         -------
@@ -108,29 +258,500 @@ class DataTransformer():
 
         """
         self._init()
-        result = self.output
-        for index, row in enumerate(dataset):
-            self.num_input += 1
-            transformed_row = dict(row)
-            row_errors = []
-            for rule_info in self.rules:
+        if checkpoint is None:
+            self.output.extend(self._run(dataset, self.skipped.append, workers, chunk_size))
+        else:
+            self._apply_checkpointed(dataset, workers, chunk_size, checkpoint, checkpoint_every)
+        return self.output
+
+    def _apply_checkpointed(self, dataset, workers, chunk_size, checkpoint, checkpoint_every):
+        if checkpoint_every < 1:
+            raise ValueError('checkpoint_every must be at least 1')
+        valid_size = self._restore_checkpoint(checkpoint)
+        rows = iter(_skip_rows(dataset, self.num_input))
+        with open(checkpoint, 'ab') as file:
+            # Drop a record truncated by the interrupted run
+            file.truncate(valid_size)
+            while True:
+                # Each segment is fully transformed before its checkpoint is written, so the
+                # saved offset always matches the saved results
+                segment = list(itertools.islice(rows, checkpoint_every))
+                if not segment:
+                    break
+                num_output = len(self.output)
+                num_skipped = len(self.skipped)
+                self.output.extend(self._run(segment, self.skipped.append, workers, chunk_size,
+                                             start=self.num_input))
+                pickle.dump(self._checkpoint_record(num_output, num_skipped), file)
+                file.flush()
+                os.fsync(file.fileno())
+        os.remove(checkpoint)
+
+    _CHECKPOINT_COUNTERS = ('num_input', '_num_output', '_num_skipped', '_num_errored', '_num_errors')
+
+    def _checkpoint_record(self, num_output, num_skipped):
+        return {
+            'counters': {name: getattr(self, name) for name in self._CHECKPOINT_COUNTERS},
+            'output': self.output[num_output:],
+            'skipped': self.skipped[num_skipped:],
+        }
+
+    def _restore_checkpoint(self, checkpoint):
+        """Restore the results saved in `checkpoint` and return the size of its valid part."""
+        try:
+            file = open(checkpoint, 'rb')
+        except FileNotFoundError:
+            return 0
+        valid_size = 0
+        with file:
+            while True:
                 try:
-                    transformed_row = rule_info.rule(transformed_row)
+                    record = pickle.load(file)
+                except EOFError:
+                    break
+                except (pickle.UnpicklingError, ValueError, AttributeError, IndexError):
+                    # The run was interrupted while the last record was written
+                    break
+                for name, value in record['counters'].items():
+                    setattr(self, name, value)
+                self.output.extend(record['output'])
+                self.skipped.extend(record['skipped'])
+                valid_size = file.tell()
+        return valid_size
+
+    def apply_iter(self, dataset, skip_sink=None, workers=None, chunk_size=1000):
+        """Apply all defined transformations to an iterable `dataset`, yielding transformed rows.
+
+        Unlike `apply`, neither output rows nor skipped rows are kept by the transformer,
+        so memory use does not grow with the dataset.
+
+        Parameters
+        ----------
+           :dataset:iterable: same as for `apply`.
+           :skip_sink: receives a SkipRowInfo for each skipped row. It can be
+                       - callable - called with the SkipRowInfo
+                       - queue-like object - the SkipRowInfo is passed to its `put` method
+                       - file-like object - the SkipRowInfo is written as a JSON line
+                       - None - skipped rows are only counted
+           :workers:int: same as for `apply`.
+           :chunk_size:int: same as for `apply`.
+
+        Side Effects
+        ------------
+        - `num_input`, `num_output`, `num_skipped`, `num_errored` and `num_errors` are updated
+          as rows are consumed. `output` and `skipped` stay empty.
+        """
+        self._init()
+        yield from self._run(dataset, _make_sink(skip_sink), workers, chunk_size)
+
+    def apply_columns(self, batches, skip_sink=None):
+        """Apply all field transformations to an iterable of column batches, yielding output batches.
+
+        Parameters
+        ----------
+           :batches:iterable: column batches. Each batch is a dictionary mapping field names to
+                              equally long columns - lists, NumPy arrays or other sequences.
+           :skip_sink: same as for `apply_iter`.
+
+        Only rules registered with `transform_field` are supported. Vectorized rules are called
+        once per column, other rules once per value. Rows with at least one error are removed from
+        the output batch and reported as SkipRowInfo. Row indexes continue across batches.
+        Counters are updated as for `apply_iter`.
+        """
+        for rule_info in self.rules:
+            if not isinstance(rule_info.rule, FieldRule):
+                raise ValueError(f'Rule {rule_info.name!r} is not a field rule and cannot be applied to columns')
+        self.compile()
+        self._init()
+        skip_sink = _make_sink(skip_sink)
+        for columns in batches:
+            yield self._transform_columns(columns, skip_sink)
+
+    def _transform_columns(self, columns, skip_sink):
+        start = self.num_input
+        num_rows = len(next(iter(columns.values()))) if columns else 0
+        transformed = dict(columns)
+        row_errors = {}
+        failed_rows = {}
+        for index, rule_info in enumerate(self.rules):
+            field_rule = rule_info.rule
+            rule = _timed(field_rule.rule, self._rule_stats, index)
+            # Rows which already failed are skipped in the output, whatever this rule returns
+            blocked = set(row_errors) if self._fail_fast else set()
+            for name in rule_info.depends_on or ():
+                blocked.update(failed_rows.get(name, ()))
+            failed = failed_rows[rule_info.name] = set(blocked)
+            try:
+                column = transformed[field_rule.field_name]
+            except KeyError as exc:
+                for row_index in range(num_rows):
+                    if row_index not in blocked:
+                        row_errors.setdefault(row_index, []).append(_error_info(rule_info.name, exc))
+                        failed.add(row_index)
+                continue
+            if field_rule.vectorized:
+                try:
+                    transformed[field_rule.field_name] = rule(column)
+                    continue
+                except Exception:
+                    pass
+            new_column = list(column)
+            for row_index, value in enumerate(column):
+                if row_index in blocked:
+                    continue
+                try:
+                    new_column[row_index] = rule(value)
                 except Exception as exc:
-                    error_text = str(exc)
-                    error = RuleErrorInfo(rule_name=rule_info.name,
-                                          error_type=type(exc).__name__,
-                                          error_text=error_text,
-                                          )
-                    row_errors.append(error)
+                    row_errors.setdefault(row_index, []).append(_error_info(rule_info.name, exc))
+                    failed.add(row_index)
+            if hasattr(column, 'dtype'):
+                new_column = _as_array(new_column, failed)
+            transformed[field_rule.field_name] = new_column
+        self.num_input += num_rows
+        for index in sorted(row_errors):
+            row = {name: column[index] for name, column in columns.items()}
+            row_id = start + index if (self._id is None) else self._id(row)
+            self._skip_row(row_id, row_errors[index], row, skip_sink)
+        self._num_output += num_rows - len(row_errors)
+        if not row_errors:
+            return transformed
+        keep = [index not in row_errors for index in range(num_rows)]
+        return {name: _select(column, keep) for name, column in transformed.items()}
+
+    def compile(self):
+        """Generate a function which applies all rules to one row.
+
+        The function takes a row and returns a tuple of the transformed row and a list of
+        RuleErrorInfo, or None if all rules succeeded. Field rules are inlined. The function
+        is cached until the rules change; `apply` compiles the rules automatically.
+        """
+        rules = tuple(self.rules)
+        if self._compiled is None or self._compiled_rules != rules:
+            if self._rule_stats is not None:
+                self._rule_stats = [RuleStats(rule_info.name) for rule_info in rules]
+            self._compiled = _compile_rules(rules, self._rule_stats, self._fail_fast)
+            self._compiled_rules = rules
+        return self._compiled
+
+    def _run(self, dataset, skip_sink, workers, chunk_size, start=0):
+        if workers is None:
+            return self._transform_rows(dataset, skip_sink, start)
+        return self._transform_rows_parallel(dataset, skip_sink, workers, chunk_size, start)
+
+    def _transform_rows_parallel(self, dataset, skip_sink, workers, chunk_size, start=0):
+        self.compile()
+        rows = iter(dataset)
+        max_pending = 2 * workers
+        pending = collections.deque()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                    initializer=_init_worker,
+                                                    initargs=(self._worker_copy(),)) as pool:
+            try:
+                while True:
+                    chunk = list(itertools.islice(rows, chunk_size))
+                    if not chunk:
+                        break
+                    if len(pending) >= max_pending:
+                        yield from self._merge_chunk(pending.popleft().result(), skip_sink)
+                    pending.append(pool.submit(_transform_chunk, start, chunk))
+                    start += len(chunk)
+                while pending:
+                    yield from self._merge_chunk(pending.popleft().result(), skip_sink)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _merge_chunk(self, chunk_result, skip_sink):
+        num_input, output, skipped, rule_stats = chunk_result
+        self.num_input += num_input
+        for parent_stats, chunk_stats in zip(self._rule_stats or (), rule_stats or ()):
+            parent_stats.merge(chunk_stats)
+        self._num_output += len(output)
+        for skip_info in skipped:
+            # Strings unpickled from a worker are new objects, intern them in this process
+            self._skip_row(skip_info.row_id, skip_info.errors, skip_info.row, skip_sink)
+        return output
+
+    def _skip_row(self, row_id, errors, row, skip_sink):
+        strings = self._strings
+        for error in errors:
+            error.rule_name = _intern(strings, error.rule_name)
+            error.error_type = _intern(strings, error.error_type)
+        skip_info = SkipRowInfo(row_id=row_id,
+                                reason=SkipReason.ERROR,
+                                errors=errors,
+                                row=None if self._drop_skipped_rows else row)
+        self._num_skipped += 1
+        self._num_errored += 1
+        self._num_errors += len(errors)
+        skip_sink(skip_info)
+
+    def _transform_rows(self, dataset, skip_sink, start=0):
+        transform_row = self.compile()
+        for index, row in enumerate(dataset, start):
+            self.num_input += 1
+            transformed_row, row_errors = transform_row(dict(row))
             if row_errors:
                 row_id = index if (self._id is None) else self._id(row)
-                skip_info = SkipRowInfo(row_id=row_id,
-                                        reason=SkipReason.ERROR,
-                                        errors=row_errors,
-                                        row=row)
-                self.skipped.append(skip_info)
+                self._skip_row(row_id, row_errors, row, skip_sink)
             else:
-                result.append(transformed_row)
+                self._num_output += 1
+                yield transformed_row
+
+
+class FieldRule:
+    """Row transformation which applies `rule` to the value of field `field_name`."""
+    def __init__(self, field_name, rule, vectorized=False):
+        self.field_name = field_name
+        self.rule = rule
+        self.vectorized = vectorized
+
+    def __call__(self, row):
+        row[self.field_name] = self.rule(row[self.field_name])
+        return row
+
+
+class CachedRule:
+    """Rule wrapper which keeps the results of up to `maxsize` values in an LRU cache.
+
+    Errors are not cached, the rule is called again for a value which failed. Values are
+    cached by type as well, so equal values of different types, e.g. 1 and 1.0, do not share results.
+    """
+    def __init__(self, rule, maxsize):
+        self.rule = rule
+        self.maxsize = maxsize
+        self.uncached = 0
+        self._cached = functools.lru_cache(maxsize, typed=True)(rule)
+
+    def __getstate__(self):
+        # The cache is local to a process, it is rebuilt empty when unpickled
+        state = dict(self.__dict__)
+        del state['_cached']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cached = functools.lru_cache(self.maxsize, typed=True)(self.rule)
+
+    def __call__(self, value):
+        try:
+            return self._cached(value)
+        except TypeError as error:
+            return self._call_unhashable(value, error)
+
+    def _call_unhashable(self, value, error):
+        """Call the rule without the cache if `value` is unhashable, otherwise re-raise `error` of the rule."""
+        try:
+            hash(value)
+        except TypeError:
+            self.uncached += 1
+            return self.rule(value)
+        raise error
+
+    def cache_info(self, name=None):
+        info = self._cached.cache_info()
+        return CacheInfo(name, info.hits, info.misses, self.uncached, info.maxsize, info.currsize)
+
+
+class RuleStats:
+    """Statistics of one rule collected by an instrumented DataTransformer.
+
+    `histogram` counts invocations by latency. A key `k` counts the invocations which took
+    less than `k` microseconds and at least `k // 2`; keys are powers of two.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.invocations = 0
+        self.total_time = 0.0
+        self.errors = collections.Counter()
+        self.histogram = collections.Counter()
+
+    @property
+    def num_errors(self):
+        return sum(self.errors.values())
+
+    @property
+    def error_rate(self):
+        return self.num_errors / self.invocations if self.invocations else 0.0
+
+    @property
+    def mean_time(self):
+        return self.total_time / self.invocations if self.invocations else 0.0
+
+    def record(self, elapsed, error_type=None):
+        self.invocations += 1
+        self.total_time += elapsed
+        self.histogram[1 << int(elapsed * 1e6).bit_length()] += 1
+        if error_type is not None:
+            self.errors[error_type] += 1
+
+    def merge(self, other):
+        self.invocations += other.invocations
+        self.total_time += other.total_time
+        self.errors.update(other.errors)
+        self.histogram.update(other.histogram)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'invocations': self.invocations,
+            'total_time': self.total_time,
+            'mean_time': self.mean_time,
+            'num_errors': self.num_errors,
+            'error_rate': self.error_rate,
+            'errors': dict(self.errors),
+            'histogram': dict(sorted(self.histogram.items())),
+        }
+
+class TimedRule:
+    """Rule wrapper which records each call of `rule` in `stats`."""
+    def __init__(self, rule, stats):
+        self.rule = rule
+        self.stats = stats
+
+    def __call__(self, value):
+        start = time.perf_counter()
+        try:
+            result = self.rule(value)
+        except Exception as exc:
+            self.stats.record(time.perf_counter() - start, type(exc).__name__)
+            raise
+        self.stats.record(time.perf_counter() - start)
         return result
 
+def _intern(strings, value):
+    """Return the copy of `value` kept in `strings`, adding it while there is room."""
+    try:
+        return strings[value]
+    except KeyError:
+        if len(strings) < MAX_INTERNED_STRINGS:
+            strings[value] = value
+        return value
+
+def _timed(rule, rule_stats, index):
+    return rule if rule_stats is None else TimedRule(rule, rule_stats[index])
+
+def _error_info(rule_name, exc):
+    return RuleErrorInfo(rule_name=rule_name,
+                         error_type=type(exc).__name__,
+                         error_text=str(exc),
+                         )
+
+def _as_array(values, failed):
+    """Return the rule results `values` as a NumPy array with the dtype of the successful results.
+
+    Rows in `failed` keep their previous value where the new dtype can hold it, they are skipped anyway.
+    """
+    if not failed:
+        return np.asarray(values)
+    succeeded = np.asarray([value for index, value in enumerate(values) if index not in failed])
+    result = np.zeros(len(values), dtype=succeeded.dtype)
+    keep = np.ones(len(values), dtype=bool)
+    keep[list(failed)] = False
+    result[keep] = succeeded
+    for index in failed:
+        try:
+            result[index] = values[index]
+        except (ValueError, TypeError):
+            pass
+    return result
+
+def _select(column, keep):
+    if hasattr(column, 'dtype'):
+        # NumPy array, boolean indexing selects the rows
+        return column[keep]
+    return [value for value, selected in zip(column, keep) if selected]
+
+
+def _compile_rules(rules, rule_stats=None, fail_fast=False):
+    args = {'_error_info': _error_info}
+    depended_on = {name for rule_info in rules for name in rule_info.depends_on or ()}
+    lines = ['def transform_row(row):',
+             '    errors = None']
+    if depended_on:
+        lines.append('    failed = set()')
+    for index, rule_info in enumerate(rules):
+        args[f'name{index}'] = rule_info.name
+        if isinstance(rule_info.rule, FieldRule):
+            args[f'field{index}'] = rule_info.rule.field_name
+            args[f'rule{index}'] = _timed(rule_info.rule.rule, rule_stats, index)
+            statements = [f'row[field{index}] = rule{index}(row[field{index}])']
+            if isinstance(rule_info.rule.rule, CachedRule) and rule_stats is None:
+                # Call the C cache directly, the wrapper only handles unhashable values
+                args[f'cached{index}'] = rule_info.rule.rule._cached
+                args[f'unhashable{index}'] = rule_info.rule.rule._call_unhashable
+                statements = ['try:',
+                              f'    row[field{index}] = cached{index}(row[field{index}])',
+                              'except TypeError as type_error:',
+                              f'    row[field{index}] = unhashable{index}(row[field{index}], type_error)']
+        else:
+            args[f'rule{index}'] = _timed(rule_info.rule, rule_stats, index)
+            statements = [f'row = rule{index}(row)']
+        block = (['try:']
+                 + ['    ' + statement for statement in statements]
+                 + ['except Exception as exc:'])
+        if fail_fast:
+            block.append(f'    return row, [_error_info(name{index}, exc)]')
+        else:
+            block += ['    if errors is None:',
+                      '        errors = []',
+                      f'    errors.append(_error_info(name{index}, exc))']
+            if rule_info.name in depended_on:
+                block.append(f'    failed.add(name{index})')
+        if rule_info.depends_on:
+            args[f'depends_on{index}'] = frozenset(rule_info.depends_on)
+            block = [f'if failed.isdisjoint(depends_on{index}):'] + ['    ' + line for line in block]
+            if rule_info.name in depended_on:
+                block += ['else:',
+                          f'    failed.add(name{index})']
+        lines += ['    ' + line for line in block]
+    lines.append('    return row, errors')
+    source = '\n'.join([f'def make({", ".join(args)}):']
+                       + ['    ' + line for line in lines]
+                       + ['    return transform_row'])
+    namespace = {}
+    exec(source, namespace)
+    return namespace['make'](**args)
+
+
+_worker_transformer = None
+
+def _init_worker(transformer):
+    global _worker_transformer
+    _worker_transformer = transformer
+
+def _transform_chunk(start, rows):
+    skipped = []
+    _worker_transformer._init()
+    output = list(_worker_transformer._transform_rows(rows, skipped.append, start))
+    return len(rows), output, skipped, _worker_transformer._rule_stats
+
+def _skip_rows(dataset, offset):
+    if not offset:
+        return dataset
+    if isinstance(dataset, collections.abc.Sequence):
+        return (dataset[index] for index in range(offset, len(dataset)))
+    return itertools.islice(dataset, offset, None)
+
+def _make_sink(sink):
+    if sink is None:
+        return lambda skip_info: None
+    if callable(sink):
+        return sink
+    if hasattr(sink, 'put'):
+        return sink.put
+    if hasattr(sink, 'write'):
+        return lambda skip_info: sink.write(json.dumps(skip_info_to_dict(skip_info), default=str) + '\n')
+    raise TypeError(f'Unsupported skip sink: {sink!r}')
+
+def skip_info_to_dict(skip_info):
+    """Convert a SkipRowInfo into a JSON-friendly dictionary."""
+    return {
+        'row_id': skip_info.row_id,
+        'reason': skip_info.reason.value,
+        'errors': [error._asdict() for error in skip_info.errors],
+        'row': skip_info.row,
+    }
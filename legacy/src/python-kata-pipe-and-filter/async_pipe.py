@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import inspect
+import threading
+
+from pipe import Pipe
+
+_DONE = object()
+
+class AsyncPipe:
+    """Asynchronous counterpart of `Pipe`.
+
+    The source can be an async iterable or a sync iterable, e.g. a `Pipe`. Sync sources
+    are pulled on the default executor so they do not block the event loop.
+    `concurrency` limits the number of function calls in flight in a stage. Stages pull
+    from upstream only while below the limit, which gives backpressure between stages.
+    """
+    def __init__(self, seq):
+        self._seq = seq
+
+    def __aiter__(self):
+        if hasattr(self._seq, '__aiter__'):
+            return self._seq.__aiter__()
+        return iterate_sync(self._seq)
+
+    def map(self, func, concurrency=1, ordered=True):
+        return AsyncPipe(async_map(func, self, concurrency, ordered))
+
+    def flat_map(self, func=None, concurrency=1, ordered=True):
+        maped = self if func is None else async_map(func, self, concurrency, ordered)
+        return AsyncPipe(async_flatten(maped))
+
+    def filter(self, func=None, concurrency=1, ordered=True):
+        checked = async_map(_FilterCheck(func), self, concurrency, ordered)
+        return AsyncPipe(item async for item, keep in checked if keep)
+
+    def to_pipe(self):
+        """Return a sync `Pipe` which iterates this pipe on an event loop in a background thread."""
+        return Pipe(iterate_in_loop(self))
+
+
+async def iterate_sync(seq):
+    loop = asyncio.get_running_loop()
+    items = iter(seq)
+    while True:
+        item = await loop.run_in_executor(None, next, items, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+async def async_map(func, seq, concurrency=1, ordered=True):
+    if concurrency < 1:
+        raise ValueError('Concurrency must be at least 1')
+    pending = collections.deque() if ordered else set()
+    try:
+        async for item in seq:
+            if len(pending) >= concurrency:
+                for result in await _completed(pending, ordered):
+                    yield result
+            task = asyncio.ensure_future(_call(func, item))
+            if ordered:
+                pending.append(task)
+            else:
+                pending.add(task)
+        while pending:
+            for result in await _completed(pending, ordered):
+                yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def async_flatten(seq):
+    async for items in seq:
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+def iterate_in_loop(aiterable):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    aiterator = aiterable.__aiter__()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(_anext(aiterator), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        if hasattr(aiterator, 'aclose'):
+            asyncio.run_coroutine_threadsafe(aiterator.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+class _FilterCheck:
+    def __init__(self, func):
+        self._func = func
+
+    async def __call__(self, item):
+        if self._func is None:
+            return item, bool(item)
+        return item, bool(await _call(self._func, item))
+
+async def _call(func, item):
+    result = func(item)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+async def _anext(aiterator):
+    return await aiterator.__anext__()
+
+async def _completed(pending, ordered):
+    if ordered:
+        return [await pending.popleft()]
+    done, not_done = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    pending.difference_update(done)
+    return [task.result() for task in done]
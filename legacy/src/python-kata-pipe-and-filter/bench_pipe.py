@@ -0,0 +1,68 @@
+"""Compare per-item `map`/`filter` stages with a batched `map_batches` stage,
+and a fused `Pipe` chain with the same stages built from builtin iterators.
+
+Usage: python bench_pipe.py [number-of-items]
+"""
+import itertools
+import re
+import sys
+import timeit
+from pipe import Pipe, np
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+BATCH_SIZE = 4096
+
+def per_item():
+    return sum(Pipe(range(N))
+               .map(lambda x: x * 3)
+               .filter(lambda x: x % 2))
+
+def batched_list():
+    return sum(Pipe(range(N))
+               .batch(BATCH_SIZE)
+               .map_batches(lambda batch: [x * 3 for x in batch if x % 2])
+               .unbatch())
+
+def batched_numpy():
+    def func(batch):
+        batch = batch * 3
+        return batch[batch % 2 == 1]
+    return sum(int(b.sum()) for b in Pipe(range(N)).batch(BATCH_SIZE, as_array=True).map_batches(func))
+
+LINES = ['Lorem ipsum, dolor sit amet!', 'Consectetur adipiscing: elit 42'] * (N // 20)
+re_non_alpha_characters = re.compile('[^a-zA-Z]')
+split_words = lambda line: re_non_alpha_characters.sub(' ', line).split(' ')
+
+def unfused_chain():
+    lines = filter(None, LINES)
+    words = itertools.chain.from_iterable(map(split_words, lines))
+    words = filter(None, words)
+    words = map(lambda w: w.lower(), words)
+    words = filter(lambda w: len(w) > 2, words)
+    return sum(1 for _ in words)
+
+def fused_chain():
+    words = (Pipe(LINES)
+             .filter()
+             .flat_map(split_words)
+             .filter()
+             .map(lambda w: w.lower())
+             .filter(lambda w: len(w) > 2))
+    return sum(1 for _ in words)
+
+def run(benchmarks, count):
+    expected = benchmarks[0]()
+    for bench in benchmarks:
+        assert bench() == expected, bench.__name__
+        seconds = min(timeit.repeat(bench, number=1, repeat=3))
+        print(f'{bench.__name__:15} {seconds:8.3f}s {count / seconds:14,.0f} items/s')
+
+def main():
+    benchmarks = [per_item, batched_list]
+    if np is not None:
+        benchmarks.append(batched_numpy)
+    run(benchmarks, N)
+    run([unfused_chain, fused_chain], len(LINES))
+
+if __name__ == "__main__":
+    main()
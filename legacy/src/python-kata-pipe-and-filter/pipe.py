@@ -1,18 +1,479 @@
+import collections
+import concurrent.futures
+import functools
 import itertools
+import os
+import queue
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EXECUTORS = {
+    'thread': concurrent.futures.ThreadPoolExecutor,
+    'process': concurrent.futures.ProcessPoolExecutor,
+}
+
+MAP = 'map'
+FILTER = 'filter'
+FLAT_MAP = 'flat_map'
+APPLY = 'apply'
+
+# Each filter of a fused step nests its code one level deeper, Python's tokenizer refuses
+# more than 100 levels of indentation and the step's function itself takes four
+MAX_FUSED_FILTERS = 90
+
+# Seconds between checks for cancellation while the prefetch buffer is full
+PREFETCH_POLL_INTERVAL = 0.1
+
+Stage = collections.namedtuple('Stage', 'kind,func,name', defaults=(None,))
 
 class Pipe:
-    def __init__(self, seq):
+    def __init__(self, seq, stages=()):
         self._seq = seq
+        self._stages = tuple(stages)
+        self._steps = None
+        self._instrumented = False
+        self._hook = None
+        self._stats = []
 
     def __iter__(self):
-        return iter(self._seq)
-    
+        if self._instrumented:
+            return self._iter_instrumented()
+        if self._steps is None:
+            self._steps = compile_stages(self._stages)
+        items = iter(self._seq)
+        for step in self._steps:
+            items = step(items)
+        return items
+
+    def _then(self, kind, func, name=None):
+        pipe = Pipe(self._seq, self._stages + (Stage(kind, func, name),))
+        pipe._instrumented = self._instrumented
+        pipe._hook = self._hook
+        return pipe
+
+    def instrument(self, hook=None):
+        """Return a pipe which records per-stage statistics while iterated.
+
+        Stages are not fused in instrumented mode. `hook`, when given, is called with
+        the list of `StageStats` when the iteration finishes, fails or is closed.
+        """
+        pipe = Pipe(self._seq, self._stages)
+        pipe._instrumented = True
+        pipe._hook = hook
+        return pipe
+
+    def stats(self):
+        """Return the list of `StageStats` for the last instrumented iteration, source first."""
+        return list(self._stats)
+
+    def _iter_instrumented(self):
+        stats = [StageStats('source')]
+        items = _Probe(iter(self._seq), stats[0])
+        for stage in self._stages:
+            stage_stats = StageStats(_stage_name(stage), stats[-1])
+            if stage.kind == APPLY:
+                items = stage.func(items, stats=stage_stats)
+            else:
+                items = _builtin_step([stage], items)
+            items = _Probe(items, stage_stats)
+            stats.append(stage_stats)
+        self._stats = stats
+        try:
+            yield from items
+        finally:
+            if self._hook is not None:
+                self._hook(stats)
+
     def map(self, func):
-        return Pipe(map(func, self))
+        return self._then(MAP, func)
+
+    def pmap(self, func, executor='thread', workers=None, ordered=True):
+        """Map items in parallel using a `thread` or `process` pool executor.
+
+        At most `2 * workers` items are in flight at any time. With `ordered=False`
+        results are yielded as soon as they complete.
+        """
+        step = functools.partial(parallel_map, func, executor=executor, workers=workers, ordered=ordered)
+        return self._then(APPLY, step, 'pmap')
 
     def flat_map(self, func=None):
-        maped = self if func is None else map(func, self)
-        return Pipe(itertools.chain.from_iterable(maped))
+        return self._then(FLAT_MAP, func)
 
     def filter(self, func=None):
-        return Pipe(filter(func, self))
+        return self._then(FILTER, func)
+
+    def batch(self, size, as_array=False):
+        """Group items into lists of up to `size` items, or NumPy arrays if `as_array` is set."""
+        return self._then(APPLY, functools.partial(batched, size=size, as_array=as_array), 'batch')
+
+    def unbatch(self):
+        return self.flat_map()
+
+    def map_batches(self, func):
+        """Map a batched pipe. `func` receives a whole batch and returns the transformed batch."""
+        return self.map(func)
+
+    def prefetch(self, size):
+        """Run the upstream stages on a background thread which keeps up to `size` items ready.
+
+        Upstream exceptions are re-raised by the consumer. Closing the iterator stops the thread
+        after its current item.
+        """
+        return self._then(APPLY, functools.partial(prefetched, size=size), 'prefetch')
+
+    def partition_by(self, key, partitions, executor='process', workers=None, chunk_size=1024):
+        """Route items into `partitions` by `hash(key(item))` for a partitioned aggregation.
+
+        See `PartitionedPipe`.
+        """
+        return PartitionedPipe(self, key, partitions, executor, workers, chunk_size)
+
+
+class PartitionedPipe:
+    """Stages of a partitioned pipe run in pool workers over chunks of each partition.
+
+    Upstream stages and `key` run in the calling process. Stages added after `partition_by`,
+    and the fold of the terminal operation, run in the workers. With the process executor
+    they must be picklable, i.e. module-level functions. Partial aggregates are combined
+    in no particular order, so the aggregation must be associative and commutative.
+    """
+    def __init__(self, upstream, key, partitions, executor='process', workers=None, chunk_size=1024, stages=()):
+        if partitions < 1:
+            raise ValueError('Number of partitions must be at least 1')
+        self._upstream = upstream
+        self._key = key
+        self._partitions = partitions
+        self._executor = executor
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._stages = tuple(stages)
+
+    def _then(self, kind, func):
+        return PartitionedPipe(self._upstream, self._key, self._partitions, self._executor, self._workers,
+                               self._chunk_size, self._stages + (Stage(kind, func),))
+
+    def map(self, func):
+        return self._then(MAP, func)
+
+    def flat_map(self, func=None):
+        return self._then(FLAT_MAP, func)
+
+    def filter(self, func=None):
+        return self._then(FILTER, func)
+
+    def reduce(self, func, initial, combine=None, merge=True):
+        """Fold each partition with `func` starting from `initial` and combine the partial results.
+
+        `initial` must be neutral for `combine`, which defaults to `func`, since every chunk
+        starts from it. Returns the merged result, or a list with one result per partition
+        if `merge` is false.
+        """
+        return self._aggregate(Reduce(func, initial, combine), merge)
+
+    def count_by(self, key=None, merge=True):
+        """Count items, or `key(item)` values, returning a `collections.Counter`."""
+        return self._aggregate(CountBy(key), merge)
+
+    def _aggregate(self, aggregator, merge):
+        workers = self._workers or os.cpu_count() or 1
+        max_pending = 2 * workers
+        buffers = [[] for _ in range(self._partitions)]
+        partials = [_EMPTY] * self._partitions
+        pending = {}
+        with EXECUTORS[self._executor](max_workers=workers) as pool:
+            def submit(index):
+                if len(pending) >= max_pending:
+                    _combine_completed(pending, partials, aggregator, concurrent.futures.FIRST_COMPLETED)
+                future = pool.submit(fold_chunk, self._stages, aggregator, buffers[index])
+                pending[future] = index
+                buffers[index] = []
+
+            try:
+                for item in self._upstream:
+                    index = hash(self._key(item)) % self._partitions
+                    buffers[index].append(item)
+                    if len(buffers[index]) >= self._chunk_size:
+                        submit(index)
+                for index, buffer in enumerate(buffers):
+                    if buffer:
+                        submit(index)
+                _combine_completed(pending, partials, aggregator, concurrent.futures.ALL_COMPLETED)
+            finally:
+                for future in pending:
+                    future.cancel()
+        partials = [aggregator.empty() if partial is _EMPTY else partial for partial in partials]
+        if not merge:
+            return partials
+        return functools.reduce(aggregator.combine, partials)
+
+
+class Reduce:
+    def __init__(self, func, initial, combine=None):
+        self.func = func
+        self.initial = initial
+        self._combine = func if combine is None else combine
+
+    def empty(self):
+        return self.initial
+
+    def fold(self, items):
+        return functools.reduce(self.func, items, self.initial)
+
+    def combine(self, left, right):
+        return self._combine(left, right)
+
+class CountBy:
+    def __init__(self, key=None):
+        self.key = key
+
+    def empty(self):
+        return collections.Counter()
+
+    def fold(self, items):
+        return collections.Counter(items if self.key is None else map(self.key, items))
+
+    def combine(self, left, right):
+        left.update(right)
+        return left
+
+_EMPTY = object()
+_DONE = object()
+
+def fold_chunk(stages, aggregator, chunk):
+    items = iter(chunk)
+    for step in compile_stages(stages):
+        items = step(items)
+    return aggregator.fold(items)
+
+def _combine_completed(pending, partials, aggregator, return_when):
+    done, not_done = concurrent.futures.wait(pending, return_when=return_when)
+    for future in done:
+        index = pending.pop(future)
+        partial = future.result()
+        partials[index] = partial if partials[index] is _EMPTY else aggregator.combine(partials[index], partial)
+
+
+def compile_stages(stages):
+    """Lower a logical plan into a list of steps, each turning an iterator into an iterator.
+
+    Consecutive map/filter stages are fused into a single generated loop. Flat maps, single
+    stages and runs without a filter function use the builtin iterators, which are faster there.
+    """
+    steps = []
+    run = []
+    for stage in stages:
+        if stage.kind in (MAP, FILTER):
+            run.append(stage)
+            continue
+        steps.extend(_fuse(run))
+        run = []
+        if stage.kind == APPLY:
+            steps.append(stage.func)
+        else:
+            steps.append(functools.partial(_builtin_step, [stage]))
+    steps.extend(_fuse(run))
+    return steps
+
+def _fuse(run):
+    steps = []
+    fused = []
+    filters = 0
+    for stage in run:
+        if stage.kind == FILTER:
+            filters += 1
+        if filters > MAX_FUSED_FILTERS:
+            steps.append(_fused_step(fused))
+            fused = []
+            filters = 1
+        fused.append(stage)
+    if fused:
+        steps.append(_fused_step(fused))
+    return steps
+
+def _fused_step(stages):
+    if len(stages) == 1 or all(stage.kind == MAP or stage.func is None for stage in stages):
+        return functools.partial(_builtin_step, stages)
+    funcs = {}
+    indent = '        '
+    lines = [
+        'def make({args}):',
+        '    def fused(items):',
+        '        for item in items:',
+    ]
+    for index, stage in enumerate(stages):
+        indent += '    '
+        if stage.func is None:
+            call = 'item'
+        else:
+            funcs[f'f{index}'] = stage.func
+            call = f'f{index}(item)'
+        if stage.kind == MAP:
+            lines.append(f'{indent}item = {call}')
+            indent = indent[:-4]
+        else:
+            lines.append(f'{indent}if {call}:')
+    lines.append(f'{indent}    yield item')
+    lines.append('    return fused')
+    namespace = {}
+    exec('\n'.join(lines).format(args=', '.join(funcs)), namespace)
+    return namespace['make'](**funcs)
+
+def _builtin_step(stages, items):
+    for stage in stages:
+        if stage.kind == MAP:
+            items = map(stage.func, items)
+        elif stage.kind == FILTER:
+            items = filter(stage.func, items)
+        else:
+            items = itertools.chain.from_iterable(items if stage.func is None else map(stage.func, items))
+    return items
+
+class StageStats:
+    """Counters of one instrumented stage.
+
+    Times are exclusive: the time spent in upstream stages of the same thread is not included.
+    `cpu_time` is measured for the consuming thread only.
+    """
+    def __init__(self, name, upstream=None):
+        self.name = name
+        self.upstream = upstream
+        self.items_out = 0
+        self.peak_buffered = 0
+        self.total_wall_time = 0.0
+        self.total_cpu_time = 0.0
+
+    @property
+    def items_in(self):
+        return None if self.upstream is None else self.upstream.items_out
+
+    @property
+    def wall_time(self):
+        upstream = 0.0 if self.upstream is None else self.upstream.total_wall_time
+        return max(0.0, self.total_wall_time - upstream)
+
+    @property
+    def cpu_time(self):
+        upstream = 0.0 if self.upstream is None else self.upstream.total_cpu_time
+        return max(0.0, self.total_cpu_time - upstream)
+
+    def buffered(self, count):
+        if count > self.peak_buffered:
+            self.peak_buffered = count
+
+    def __repr__(self):
+        return (f'StageStats(name={self.name!r}, items_in={self.items_in}, items_out={self.items_out}, '
+                f'wall_time={self.wall_time:.6f}, cpu_time={self.cpu_time:.6f}, peak_buffered={self.peak_buffered})')
+
+class _Probe:
+    def __init__(self, items, stats):
+        self._items = items
+        self._stats = stats
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        stats = self._stats
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            item = next(self._items)
+        finally:
+            stats.total_wall_time += time.perf_counter() - wall
+            stats.total_cpu_time += time.thread_time() - cpu
+        stats.items_out += 1
+        return item
+
+def _stage_name(stage):
+    if stage.name is not None:
+        return stage.name
+    if stage.func is None:
+        return stage.kind
+    return f'{stage.kind}({getattr(stage.func, "__name__", type(stage.func).__name__)})'
+
+def parallel_map(func, seq, executor='thread', workers=None, ordered=True, stats=None):
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    pending = collections.deque() if ordered else set()
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        try:
+            for item in seq:
+                if len(pending) >= max_pending:
+                    yield from _completed(pending, ordered)
+                future = pool.submit(func, item)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+                if stats is not None:
+                    stats.buffered(len(pending))
+            while pending:
+                yield from _completed(pending, ordered)
+        finally:
+            for future in pending:
+                future.cancel()
+
+def batched(seq, size, as_array=False, stats=None):
+    if size < 1:
+        raise ValueError('Batch size must be at least 1')
+    if as_array and np is None:
+        raise ImportError('NumPy is required for as_array=True')
+    items = iter(seq)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        if stats is not None:
+            stats.buffered(len(chunk))
+        yield np.asarray(chunk) if as_array else chunk
+
+def prefetched(seq, size, stats=None):
+    if size < 1:
+        raise ValueError('Prefetch size must be at least 1')
+    buffer = queue.Queue(size)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in seq:
+                if not _put(buffer, (None, item), stop):
+                    return
+            _put(buffer, (_DONE, None), stop)
+        except BaseException as exc:
+            _put(buffer, (exc, None), stop)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            error, item = buffer.get()
+            if error is _DONE:
+                return
+            if error is not None:
+                raise error
+            if stats is not None:
+                stats.buffered(buffer.qsize() + 1)
+            yield item
+    finally:
+        stop.set()
+
+def _put(buffer, entry, stop):
+    while not stop.is_set():
+        try:
+            buffer.put(entry, timeout=PREFETCH_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _completed(pending, ordered):
+    if ordered:
+        yield pending.popleft().result()
+        return
+    done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    pending.difference_update(done)
+    for future in done:
+        yield future.result()
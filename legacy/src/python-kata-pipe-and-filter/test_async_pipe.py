@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+from pipe import Pipe
+from async_pipe import AsyncPipe
+
+async def agenerate(items):
+    for item in items:
+        await asyncio.sleep(0)
+        yield item
+
+async def anegate(x):
+    await asyncio.sleep(0)
+    return -x
+
+async def collect(pipe):
+    return [x async for x in pipe]
+
+class TestAsyncPipe(unittest.IsolatedAsyncioTestCase):
+
+    async def test_Should_IterateOverTheSameSequence_When_CreatedFromAsyncIterable(self):
+        pipe = AsyncPipe(agenerate([2,3,4]))
+        result = await collect(pipe)
+        self.assertEqual([2,3,4], result)
+
+    async def test_Should_IterateOverTheSameSequence_When_CreatedFromPipe(self):
+        pipe = AsyncPipe(Pipe([2,3,4]).map(lambda x: x * 10))
+        result = await collect(pipe)
+        self.assertEqual([20,30,40], result)
+
+    async def test_Should_ReturnMappedValues_When_AsyncMapApplied(self):
+        pipe = AsyncPipe(agenerate([7,8,9])).map(anegate, concurrency=2)
+        result = await collect(pipe)
+        self.assertEqual([-7,-8,-9], result)
+
+    async def test_Should_LimitCallsInFlight_When_ConcurrencySpecified(self):
+        running = []
+        peak = []
+        async def func(x):
+            running.append(x)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(x)
+            return x
+        pipe = AsyncPipe(agenerate(range(20))).map(func, concurrency=5)
+        result = await collect(pipe)
+        self.assertEqual(list(range(20)), result)
+        self.assertEqual(5, max(peak))
+
+    async def test_Should_ReturnValuesInCompletionOrder_When_UnorderedMapApplied(self):
+        async def func(x):
+            await asyncio.sleep(0.01 * (5 - x))
+            return x
+        pipe = AsyncPipe(agenerate(range(5))).map(func, concurrency=5, ordered=False)
+        result = await collect(pipe)
+        self.assertEqual([4,3,2,1,0], result)
+
+    async def test_Should_ReturnMappedFlattenedValues_When_FlatMapApplied(self):
+        async def func(x):
+            return x.lower().split(' ')
+        pipe = AsyncPipe(agenerate(['Lorem ipsum', 'dolorem costum'])).flat_map(func, concurrency=2)
+        result = await collect(pipe)
+        self.assertEqual(['lorem', 'ipsum', 'dolorem', 'costum'], result)
+
+    async def test_Should_FlattenAsyncIterables_When_FlatMapAppliedWithoutFunc(self):
+        pipe = AsyncPipe(agenerate([agenerate([1,2]), [3]])).flat_map()
+        result = await collect(pipe)
+        self.assertEqual([1,2,3], result)
+
+    async def test_Should_DropFilteredOutValues_When_FilterApplied(self):
+        async def func(x):
+            return x >= 0
+        pipe = AsyncPipe(agenerate([-1, 3, -6, 5])).filter(func, concurrency=3)
+        result = await collect(pipe)
+        self.assertEqual([3,5], result)
+
+    async def test_Should_PropagateException_When_MapFuncRaises(self):
+        async def fail(x):
+            raise ValueError(x)
+        pipe = AsyncPipe(agenerate([1])).map(fail)
+        with self.assertRaises(ValueError):
+            await collect(pipe)
+
+
+class TestAsyncPipeToPipe(unittest.TestCase):
+
+    def test_Should_IterateSynchronously_When_ConvertedToPipe(self):
+        pipe = AsyncPipe(agenerate([1,2,3])).map(anegate, concurrency=2).to_pipe().map(abs)
+        result = [x for x in pipe]
+        self.assertEqual([1,2,3], result)
+
+    def test_Should_PropagateException_When_ConvertedToPipe(self):
+        async def fail(x):
+            raise ValueError(x)
+        pipe = AsyncPipe(agenerate([1])).map(fail).to_pipe()
+        with self.assertRaises(ValueError):
+            list(pipe)
+
+
+if __name__ == "__main__":
+    unittest.main(argv=[__file__,'-vv'])
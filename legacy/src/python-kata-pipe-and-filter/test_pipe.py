@@ -1,6 +1,20 @@
+import operator
+import threading
+import time
 import unittest
+from collections import Counter
 from unittest import mock
-from pipe import Pipe
+import pipe as pipe_module
+from pipe import Pipe, Stage, MAP, FILTER, FLAT_MAP, compile_stages
+
+def negate(x):
+    return -x
+
+def split_words(line):
+    return line.lower().split(' ')
+
+def is_word(word):
+    return len(word) > 0
 
 class TestPipe(unittest.TestCase):
     
@@ -31,5 +45,200 @@ class TestPipe(unittest.TestCase):
         result = [x for x in pipe]
         self.assertEqual([3,5], result)
 
+    def test_Should_ReturnMappedValuesInOrder_When_ThreadPmapApplied(self):
+        input = range(20)
+        pipe = Pipe(input).pmap(negate, workers=3)
+        result = [x for x in pipe]
+        self.assertEqual([-x for x in input], result)
+
+    def test_Should_ReturnMappedValuesInOrder_When_ProcessPmapApplied(self):
+        input = range(20)
+        pipe = Pipe(input).pmap(negate, executor='process', workers=2)
+        result = [x for x in pipe]
+        self.assertEqual([-x for x in input], result)
+
+    def test_Should_ReturnAllMappedValues_When_UnorderedPmapApplied(self):
+        input = range(20)
+        pipe = Pipe(input).pmap(negate, workers=3, ordered=False)
+        result = [x for x in pipe]
+        self.assertEqual(sorted(-x for x in input), sorted(result))
+
+    def test_Should_BoundInFlightItems_When_PmapApplied(self):
+        pulled = []
+        def source():
+            for x in range(100):
+                pulled.append(x)
+                yield x
+        pipe = Pipe(source()).pmap(negate, workers=2)
+        next(iter(pipe))
+        self.assertLessEqual(len(pulled), 5)
+
+    def test_Should_PropagateException_When_PmapFuncRaises(self):
+        def fail(x):
+            raise ValueError(x)
+        pipe = Pipe([1]).pmap(fail)
+        with self.assertRaises(ValueError):
+            list(pipe)
+
+    def test_Should_GroupItemsInBatches_When_BatchApplied(self):
+        pipe = Pipe(range(7)).batch(3)
+        result = [x for x in pipe]
+        self.assertEqual([[0,1,2], [3,4,5], [6]], result)
+
+    def test_Should_RaiseValueError_When_BatchSizeIsNotPositive(self):
+        with self.assertRaises(ValueError):
+            list(Pipe([1]).batch(0))
+
+    def test_Should_FlattenBatches_When_UnbatchApplied(self):
+        pipe = Pipe(range(7)).batch(3).unbatch()
+        result = [x for x in pipe]
+        self.assertEqual(list(range(7)), result)
+
+    def test_Should_PassWholeBatchToFunc_When_MapBatchesApplied(self):
+        func = lambda batch: [x * 2 for x in batch if x % 2]
+        pipe = Pipe(range(7)).batch(3).map_batches(func).unbatch()
+        result = [x for x in pipe]
+        self.assertEqual([2, 6, 10], result)
+
+    @unittest.skipIf(pipe_module.np is None, 'NumPy is not installed')
+    def test_Should_PassNumpyArrays_When_BatchedAsArray(self):
+        func = lambda batch: batch[batch > 2] * 2
+        pipe = Pipe(range(7)).batch(3, as_array=True).map_batches(func).unbatch()
+        result = [int(x) for x in pipe]
+        self.assertEqual([6, 8, 10, 12], result)
+
+
+    def test_Should_ProduceSameResult_When_StagesAreFused(self):
+        input = ['Lorem ipsum', '', 'dolorem costum']
+        pipe = (Pipe(input)
+                .filter()
+                .flat_map(lambda x: x.split(' '))
+                .map(lambda x: x.upper())
+                .filter(lambda x: 'O' in x)
+                .flat_map())
+        result = [x for x in pipe]
+        self.assertEqual(list('LOREMDOLOREMCOSTUM'), result)
+
+    def test_Should_IterateAgain_When_SourceIsReiterable(self):
+        pipe = Pipe([1, 2, 3]).map(negate).filter(lambda x: x != -2)
+        self.assertEqual([-1, -3], list(pipe))
+        self.assertEqual([-1, -3], list(pipe))
+
+    def test_Should_FuseChainIntoSingleStep_When_StagesAreMapAndFilter(self):
+        stages = [Stage(MAP, negate), Stage(FILTER, bool), Stage(FILTER, None), Stage(MAP, negate)]
+        self.assertEqual(1, len(compile_stages(stages)))
+
+    def test_Should_KeepFlatMapAsSeparateStep_When_Compiled(self):
+        stages = [Stage(MAP, negate), Stage(FILTER, bool), Stage(FLAT_MAP, None), Stage(MAP, negate)]
+        self.assertEqual(3, len(compile_stages(stages)))
+
+    def test_Should_SplitFusedSteps_When_ChainIsTooDeeplyNested(self):
+        pipe = Pipe(range(10))
+        for _ in range(200):
+            pipe = pipe.filter(lambda x: x % 3).map(lambda x: x)
+        result = [x for x in pipe]
+        self.assertEqual([1, 2, 4, 5, 7, 8], result)
+        self.assertEqual(3, len(compile_stages([Stage(FILTER, bool)] * 200)))
+
+
+    def test_Should_RecordItemCountsPerStage_When_Instrumented(self):
+        pipe = Pipe(range(10)).instrument().filter(lambda x: x % 2).map(negate).batch(2)
+        result = [x for x in pipe]
+        stats = pipe.stats()
+        self.assertEqual([[-1, -3], [-5, -7], [-9]], result)
+        self.assertEqual(['source', 'filter(<lambda>)', 'map(negate)', 'batch'], [s.name for s in stats])
+        self.assertEqual([None, 10, 5, 5], [s.items_in for s in stats])
+        self.assertEqual([10, 5, 5, 3], [s.items_out for s in stats])
+        self.assertEqual(2, stats[-1].peak_buffered)
+        self.assertTrue(all(s.wall_time >= 0 and s.cpu_time >= 0 for s in stats))
+
+    def test_Should_CallHookWithStats_When_InstrumentedIterationFinishes(self):
+        hook = mock.Mock()
+        pipe = Pipe(range(3)).map(negate).instrument(hook)
+        list(pipe)
+        hook.assert_called_once_with(pipe.stats())
+
+    def test_Should_RecordPeakInFlightItems_When_PmapInstrumented(self):
+        pipe = Pipe(range(20)).pmap(negate, workers=2).instrument()
+        list(pipe)
+        self.assertEqual(4, pipe.stats()[-1].peak_buffered)
+
+    def test_Should_ReturnNoStats_When_NotInstrumented(self):
+        pipe = Pipe(range(3)).map(negate)
+        list(pipe)
+        self.assertEqual([], pipe.stats())
+
+
+    def test_Should_CountWordsAcrossPartitions_When_CountByApplied(self):
+        input = ['Lorem ipsum', 'dolorem  ipsum', 'Lorem costum', 'ipsum']
+        result = (Pipe(input)
+                  .partition_by(len, 3, workers=2, chunk_size=1)
+                  .flat_map(split_words)
+                  .filter(is_word)
+                  .count_by())
+        self.assertEqual(Counter(lorem=2, ipsum=3, dolorem=1, costum=1), result)
+
+    def test_Should_ReturnResultPerPartition_When_NotMerged(self):
+        result = (Pipe(range(10))
+                  .partition_by(lambda x: x % 2, 2, executor='thread', chunk_size=2)
+                  .map(negate)
+                  .reduce(operator.add, 0, merge=False))
+        self.assertEqual([-20, -25], result)
+
+    def test_Should_ReturnInitialForEmptyPartitions_When_Reduced(self):
+        result = Pipe([]).partition_by(negate, 2, executor='thread').reduce(operator.add, 0, merge=False)
+        self.assertEqual([0, 0], result)
+
+    def test_Should_MergePartialResults_When_ReducedInProcesses(self):
+        result = Pipe(range(100)).partition_by(negate, 4, workers=2, chunk_size=7).reduce(operator.add, 0)
+        self.assertEqual(sum(range(100)), result)
+
+
+    def test_Should_IterateOverTheSameSequence_When_PrefetchApplied(self):
+        pipe = Pipe(range(100)).map(negate).prefetch(3).filter(lambda x: x % 2)
+        result = [x for x in pipe]
+        self.assertEqual([-x for x in range(100) if x % 2], result)
+
+    def test_Should_ProduceOnBackgroundThread_When_PrefetchApplied(self):
+        threads = []
+        def source():
+            for x in range(3):
+                threads.append(threading.current_thread())
+                yield x
+        list(Pipe(source()).prefetch(2))
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_Should_BoundBufferedItems_When_PrefetchApplied(self):
+        pulled = []
+        def source():
+            for x in range(100):
+                pulled.append(x)
+                yield x
+        items = iter(Pipe(source()).prefetch(2))
+        next(items)
+        time.sleep(0.05)
+        self.assertLessEqual(len(pulled), 4)
+        items.close()
+
+    def test_Should_PropagateException_When_PrefetchUpstreamRaises(self):
+        def fail(x):
+            raise ValueError(x)
+        pipe = Pipe([1]).map(fail).prefetch(2)
+        with self.assertRaises(ValueError):
+            list(pipe)
+
+    def test_Should_StopProducer_When_PrefetchIteratorClosed(self):
+        pulled = []
+        def source():
+            for x in range(100):
+                pulled.append(x)
+                yield x
+        items = iter(Pipe(source()).prefetch(1))
+        next(items)
+        items.close()
+        time.sleep(0.3)
+        self.assertLessEqual(len(pulled), 3)
+
+
 if __name__ == "__main__":
     unittest.main(argv=[__file__,'-vv'])
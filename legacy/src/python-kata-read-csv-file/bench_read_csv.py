@@ -0,0 +1,56 @@
+"""Compare reading a CSV file as namedtuple rows with reading it as column batches
+and with parsing memory-mapped ranges of it in worker processes.
+
+The input is `techcrunch.csv` from the average kata repeated to the requested scale.
+
+Usage: python bench_read_csv.py [scale]
+"""
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from read_csv import read_csv, read_csv_columns, read_csv_mmap, CsvStream
+
+SOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python-kata-average', 'techcrunch.csv')
+SCALE = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+def make_input(file_name):
+    with open(SOURCE_FILE, newline='') as source:
+        header, *data = source.readlines()
+    with open(file_name, 'w', newline='') as target:
+        target.write(header)
+        for _ in range(SCALE):
+            target.writelines(data)
+
+def stream_rows(file_name):
+    with CsvStream(file_name) as stream:
+        return list(stream)
+
+def column_batches(file_name, **kwargs):
+    return list(read_csv_columns(file_name, **kwargs))
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file_name = os.path.join(tmpdir, 'techcrunch.csv')
+        make_input(file_name)
+        benchmarks = {
+            'namedtuple rows': lambda: list(read_csv(file_name)),
+            'csv stream': lambda: stream_rows(file_name),
+            'mmap rows': lambda: list(read_csv_mmap(file_name, chunk_size=2**20)),
+            'column batches': lambda: column_batches(file_name),
+            'typed columns': lambda: column_batches(file_name, infer_types=True),
+            'projected columns': lambda: column_batches(file_name, columns=['company', 'raisedAmt'],
+                                                        infer_types=True),
+        }
+        for name, bench in benchmarks.items():
+            seconds = min(timeit.repeat(bench, number=1, repeat=3))
+            tracemalloc.start()
+            result = bench()
+            size, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del result
+            print(f'{name:18} {seconds:8.3f}s retained {size / 2**20:8.1f} MiB peak {peak / 2**20:8.1f} MiB')
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,28 @@
+import array
+import collections
+import concurrent.futures
 import csv
+import io
+import itertools
+import math
+import mmap
+import operator
+import os
+import re
 from collections import namedtuple
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INT = 'int'
+FLOAT = 'float'
+STR = 'str'
+
 def get_file_lines(file_name):
-    global file
     with open(file_name) as file:
-        return (line for line in file)
+        yield from file
 
 def read_csv(file_name):
     lines = get_file_lines(file_name)
@@ -13,3 +31,184 @@ def read_csv(file_name):
     Row = namedtuple('Row', header_row)
     rows = (Row(*row) for row in data_rows)
     return rows
+
+class CsvStream:
+    """Stream of namedtuple rows over a CSV file which owns the open file.
+
+    The file is read through a buffer of `buffer_size` bytes, so memory use does not depend
+    on the size of the file. Use it as a context manager or call `close()` when done.
+    """
+    def __init__(self, file_name, buffer_size=2**20, encoding=None):
+        self._file = open(file_name, newline='', buffering=buffer_size, encoding=encoding)
+        try:
+            self._reader = csv.reader(self._file)
+            header_row = next(self._reader, None)
+            self.Row = None if header_row is None else namedtuple('Row', header_row)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.Row is None:
+            raise StopIteration
+        return self.Row(*next(self._reader))
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+
+def read_csv_columns(file_name, batch_size=8192, columns=None, infer_types=False, as_numpy=False):
+    """Read a CSV file in batches of up to `batch_size` rows, column by column.
+
+    Each batch is a dictionary mapping column names to column values. `columns` selects
+    and orders the columns to return. Without type inference columns are lists of strings.
+    With `infer_types` every column starts as `int` and is widened to `float` and then to
+    `str` as soon as a value does not fit; the widened type is kept for later batches.
+    Numeric columns are `array.array` objects and empty numeric values are NaN.
+    With `as_numpy` columns are NumPy arrays.
+    A row which is too short to have all of the selected columns raises ValueError.
+    """
+    if as_numpy and np is None:
+        raise ImportError('NumPy is required for as_numpy=True')
+    with open(file_name, newline='') as file:
+        reader = csv.reader(file)
+        header_row = next(reader)
+        names = header_row if columns is None else list(columns)
+        indexes = [header_row.index(name) for name in names]
+        kinds = [INT if infer_types else STR] * len(names)
+        project = _projection(indexes)
+        num_rows = 0
+        while True:
+            rows = list(itertools.islice(reader, batch_size))
+            if not rows:
+                return
+            try:
+                values = list(zip(*map(project, rows)))
+            except IndexError:
+                _raise_short_row(rows, num_rows, indexes)
+            num_rows += len(rows)
+            batch = {}
+            for position, name in enumerate(names):
+                kinds[position], column = _convert_column(values[position], kinds[position], as_numpy)
+                batch[name] = column
+            yield batch
+
+def _projection(indexes):
+    """Return a function which takes the fields at `indexes` from a row, as a tuple."""
+    if len(indexes) == 1:
+        index, = indexes
+        return lambda row: (row[index],)
+    if not indexes:
+        return lambda row: ()
+    return operator.itemgetter(*indexes)
+
+def _raise_short_row(rows, num_rows, indexes):
+    needed = max(indexes) + 1
+    for number, row in enumerate(rows, num_rows + 1):
+        if len(row) < needed:
+            raise ValueError(f'Data row {number} has {len(row)} fields, at least {needed} are needed')
+
+def read_csv_mmap(file_name, workers=None, chunk_size=16 * 2**20, ordered=True, encoding='utf-8'):
+    """Read a CSV file as namedtuple rows, parsing byte ranges of the file in worker processes.
+
+    The memory-mapped file is split into ranges of about `chunk_size` bytes, ending on a
+    newline outside of quoted fields. At most `2 * workers` ranges are parsed at a time.
+    With `ordered=False` the rows of each range are returned as soon as it is parsed.
+    `encoding` must encode the newline as a single `\\n` byte, like UTF-8 does.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = 2 * workers
+    with open(file_name, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = _record_end(data, 0, 0)
+            header_row = next(csv.reader(io.StringIO(data[:header_end].decode(encoding), newline='')))
+            ranges = list(_split_ranges(data, header_end, chunk_size))
+    Row = namedtuple('Row', header_row)
+    pending = collections.deque() if ordered else set()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        try:
+            for start, end in ranges:
+                if len(pending) >= max_pending:
+                    for rows in _completed(pending, ordered):
+                        yield from (Row(*row) for row in rows)
+                future = pool.submit(_parse_range, file_name, start, end, encoding)
+                if ordered:
+                    pending.append(future)
+                else:
+                    pending.add(future)
+            while pending:
+                for rows in _completed(pending, ordered):
+                    yield from (Row(*row) for row in rows)
+        finally:
+            for future in pending:
+                future.cancel()
+
+def _split_ranges(data, start, chunk_size):
+    size = len(data)
+    while start < size:
+        end = min(start + chunk_size, size)
+        end = _record_end(data, start, end)
+        yield start, end
+        start = end
+
+# A quoted field, a quote only starts one at the beginning of a field and "" escapes a quote
+QUOTED_FIELD = re.compile(rb'(?<![^,\n])"(?:[^"]+|"")*(?:"|\Z)')
+
+def _record_end(data, start, position):
+    """Return the offset after the first newline at or after `position` which is outside quotes.
+
+    `start` must be the beginning of a record. Like `csv.reader`, a quote inside an unquoted
+    field is an ordinary character.
+    """
+    while True:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            return len(data)
+        quoted = QUOTED_FIELD.search(data, start, newline)
+        if quoted is None:
+            return newline + 1
+        # Skip the whole quoted field, the newline may be inside of it
+        start = QUOTED_FIELD.match(data, quoted.start()).end()
+        position = max(position, start)
+
+def _parse_range(file_name, start, end, encoding):
+    with open(file_name, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode(encoding)
+    return list(csv.reader(io.StringIO(text, newline='')))
+
+def _completed(pending, ordered):
+    if ordered:
+        return [pending.popleft().result()]
+    done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    pending.difference_update(done)
+    return [future.result() for future in done]
+
+def _convert_column(values, kind, as_numpy):
+    if kind == INT:
+        try:
+            column = array.array('q', map(int, values))
+            return INT, np.frombuffer(column, dtype=np.int64) if as_numpy else column
+        except (ValueError, OverflowError):
+            kind = FLOAT
+    if kind == FLOAT:
+        try:
+            column = array.array('d', [float(value) if value else math.nan for value in values])
+            return FLOAT, np.frombuffer(column, dtype=np.float64) if as_numpy else column
+        except ValueError:
+            kind = STR
+    return STR, np.array(values) if as_numpy else list(values)
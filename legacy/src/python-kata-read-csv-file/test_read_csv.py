@@ -1,7 +1,12 @@
+import array
+import math
+import os
+import tempfile
 import unittest
 from unittest import mock
 from collections import namedtuple
-from read_csv import get_file_lines, read_csv
+import read_csv as read_csv_module
+from read_csv import get_file_lines, read_csv, read_csv_columns, read_csv_mmap, CsvStream
 
 class TestGetFileLines(unittest.TestCase):
     
@@ -14,6 +19,13 @@ class TestGetFileLines(unittest.TestCase):
                 pass
         self.assertTrue(m_open.return_value.__exit__.called)
 
+    def test_Should_KeepFileOpen_When_IterationNotExhausted(self):
+        with mock.patch('builtins.open', mock.MagicMock()) as m_open:
+            m_open.return_value.__enter__.return_value = [1,2]
+            lines = get_file_lines('myfile')
+            next(lines)
+            self.assertFalse(m_open.return_value.__exit__.called)
+
     def test_Should_IterateOverFileLines_When_Iterated(self):
         with mock.patch('builtins.open', mock.MagicMock()) as m_open:
             m_open.return_value.__enter__.return_value = [1,2]
@@ -33,5 +45,131 @@ class TestReadCsv(unittest.TestCase):
             self.assertEqual(expected, result)
 
 
+class TestCsvStream(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.file_name = os.path.join(tmpdir.name, 'data.csv')
+        with open(self.file_name, 'w', newline='') as file:
+            file.write('id,name\n1,John\n2,"Doe\nJane"\n')
+
+    def test_Should_IterateOverNamedTupleRows_When_Iterated(self):
+        with CsvStream(self.file_name) as stream:
+            result = list(stream)
+        Row = namedtuple('Row', 'id,name')
+        self.assertEqual([Row('1', 'John'), Row('2', 'Doe\nJane')], result)
+
+    def test_Should_ReadRowsLazily_When_Iterated(self):
+        with CsvStream(self.file_name) as stream:
+            self.assertEqual('1', next(stream).id)
+            self.assertEqual('2', next(stream).id)
+
+    def test_Should_CloseFile_When_ContextExited(self):
+        with CsvStream(self.file_name) as stream:
+            self.assertFalse(stream.closed)
+        self.assertTrue(stream.closed)
+
+    def test_Should_CloseFile_When_CloseCalled(self):
+        stream = CsvStream(self.file_name)
+        stream.close()
+        self.assertTrue(stream.closed)
+
+    def test_Should_KeepQuoteAsCharacter_When_QuoteInsideUnquotedField(self):
+        with open(self.file_name, 'w', newline='') as file:
+            file.write('id,desc\n1,5" screen\n2,foo\n3,"a\nb"\n')
+        Row = namedtuple('Row', 'id,desc')
+
+        result = list(read_csv_mmap(self.file_name, workers=2, chunk_size=1))
+        self.assertEqual([Row('1', '5" screen'), Row('2', 'foo'), Row('3', 'a\nb')], result)
+
+    def test_Should_ReturnNoRows_When_FileIsEmpty(self):
+        open(self.file_name, 'w').close()
+        with CsvStream(self.file_name) as stream:
+            self.assertEqual([], list(stream))
+
+
+class TestReadCsvColumns(unittest.TestCase):
+
+    CSV_DATA = 'id,name,score\n1,John,2\n2,"Doe, Jane",\n3,Bob,7\n'
+
+    def read(self, **kwargs):
+        with mock.patch('builtins.open', mock.mock_open(read_data=self.CSV_DATA)):
+            return list(read_csv_columns('myfile', **kwargs))
+
+    def test_Should_ReturnColumnsOfStrings_When_Called(self):
+        result = self.read()
+        expected = [{'id': ['1', '2', '3'], 'name': ['John', 'Doe, Jane', 'Bob'], 'score': ['2', '', '7']}]
+        self.assertEqual(expected, result)
+
+    def test_Should_SplitRowsIntoBatches_When_BatchSizeGiven(self):
+        result = self.read(batch_size=2)
+        self.assertEqual([['1', '2'], ['3']], [batch['id'] for batch in result])
+
+    def test_Should_ReturnSelectedColumnsOnly_When_ColumnsGiven(self):
+        result = self.read(columns=['name', 'id'])
+        self.assertEqual([['name', 'id']], [list(batch) for batch in result])
+
+    def test_Should_ReturnTypedArrays_When_TypesInferred(self):
+        batch, = self.read(infer_types=True)
+        self.assertEqual(array.array('q', [1, 2, 3]), batch['id'])
+        self.assertEqual(['John', 'Doe, Jane', 'Bob'], batch['name'])
+        self.assertEqual('d', batch['score'].typecode)
+        self.assertEqual([2.0, 7.0], [batch['score'][0], batch['score'][2]])
+        self.assertTrue(math.isnan(batch['score'][1]))
+
+    def test_Should_KeepWidenedType_When_LaterBatchesAreRead(self):
+        result = self.read(columns=['score'], batch_size=1, infer_types=True)
+        self.assertEqual(['q', 'd', 'd'], [batch['score'].typecode for batch in result])
+
+    def test_Should_RaiseValueError_When_RowIsMissingSelectedColumn(self):
+        self.CSV_DATA = 'id,name,score\n1,John,2\n2,Jane\n3,Bob,7\n'
+        for batch_size in (1, 2, 10):
+            with self.assertRaisesRegex(ValueError, 'Data row 2 has 2 fields'):
+                self.read(batch_size=batch_size)
+
+    def test_Should_IgnoreShortRow_When_SelectedColumnsPresent(self):
+        self.CSV_DATA = 'id,name,score\n1,John,2\n2,Jane\n'
+        result = self.read(columns=['name', 'id'])
+        self.assertEqual([{'name': ['John', 'Jane'], 'id': ['1', '2']}], result)
+
+    @unittest.skipIf(read_csv_module.np is None, 'NumPy is not installed')
+    def test_Should_ReturnNumpyArrays_When_AsNumpyGiven(self):
+        batch, = self.read(columns=['id'], infer_types=True, as_numpy=True)
+        self.assertEqual([1, 2, 3], batch['id'].tolist())
+
+
+class TestReadCsvMmap(unittest.TestCase):
+
+    CSV_DATA = 'id,"name"\n1,John\n2,"Doe\nJane"\n3,"say ""hi""\n"\n4,Bob'
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.file_name = os.path.join(tmpdir.name, 'data.csv')
+        with open(self.file_name, 'w', newline='') as file:
+            file.write(self.CSV_DATA)
+
+    def expected(self):
+        Row = namedtuple('Row', 'id,name')
+        return [Row('1', 'John'), Row('2', 'Doe\nJane'), Row('3', 'say "hi"\n'), Row('4', 'Bob')]
+
+    def test_Should_ReturnRowsInOrder_When_RangesParsedInParallel(self):
+        result = list(read_csv_mmap(self.file_name, workers=2, chunk_size=3))
+        self.assertEqual(self.expected(), result)
+
+    def test_Should_ReturnAllRows_When_Unordered(self):
+        result = list(read_csv_mmap(self.file_name, workers=2, chunk_size=3, ordered=False))
+        self.assertEqual(sorted(self.expected()), sorted(result))
+
+    def test_Should_ReturnSameRows_When_FileFitsOneRange(self):
+        result = list(read_csv_mmap(self.file_name, workers=1))
+        self.assertEqual(self.expected(), result)
+
+    def test_Should_ReturnNoRows_When_FileIsEmpty(self):
+        open(self.file_name, 'w').close()
+        self.assertEqual([], list(read_csv_mmap(self.file_name)))
+
+
 if __name__ == "__main__":
     unittest.main(argv=[__file__,'-vv'])